@@ -1,7 +1,134 @@
 # -*- coding: utf-8 -*-
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.query import QuerySet
 
-from accounts.models import Account
+from datetime import datetime
+import hashlib
 
+from accounts.models import Account, REFRESHABLE_PROVIDERS, TOKEN_EXPIRY_MARGIN
+from accounts.refresh import bulk_refresh, revoke_tokens
 
-admin.site.register(Account)
+
+# below this many rows postgresql's estimate is not worth it, the count is cheap
+ESTIMATE_THRESHOLD = 100000
+
+
+class CountCachingQuerySet(QuerySet):
+    """
+    The changelist counts the filtered and the whole table on every page,
+    each a full scan on a large table. Counts are cached for
+    ACCOUNTS_ADMIN_COUNT_TIMEOUT seconds, and the unfiltered count comes
+    from the planner statistics on postgresql.
+    """
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+
+        if not self.query.where:
+            estimate = self.estimate()
+            if estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+
+        sql, params = self.query.sql_with_params()
+        key = 'accounts:admin:count:{0}'.format(
+            hashlib.md5(repr((sql, params))).hexdigest()
+        )
+        count = cache.get(key)
+        if count is None:
+            count = super(CountCachingQuerySet, self).count()
+            cache.set(key, count, getattr(settings, 'ACCOUNTS_ADMIN_COUNT_TIMEOUT', 60))
+        return count
+
+    def estimate(self):
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            return 0
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE relname = %s',
+            [self.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+
+class ExpiryListFilter(admin.SimpleListFilter):
+    # served by the expires_in index
+    title = u'validade do token'
+    parameter_name = 'expiry'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('expired', u'Expirado'),
+            ('expiring', u'Expirando'),
+            ('valid', u'Válido'),
+            ('never', u'Sem expiração'),
+        )
+
+    def queryset(self, request, queryset):
+        now = datetime.now()
+        if self.value() == 'expired':
+            return queryset.filter(expires_in__lte=now)
+        if self.value() == 'expiring':
+            return queryset.filter(expires_in__gt=now, expires_in__lte=now + TOKEN_EXPIRY_MARGIN)
+        if self.value() == 'valid':
+            return queryset.filter(expires_in__gt=now + TOKEN_EXPIRY_MARGIN)
+        if self.value() == 'never':
+            return queryset.filter(expires_in__isnull=True)
+
+
+class AccountAdmin(admin.ModelAdmin):
+    list_display = (
+        'provider_username', 'provider', 'provider_id', 'user', 'expires_in', 'updated_on'
+    )
+    list_filter = ('provider', ExpiryListFilter)
+    list_select_related = True
+    # prefix search, served by the provider_username index
+    search_fields = ('^provider_username',)
+    raw_id_fields = ('user',)
+    actions = ['refresh_selected', 'revoke_selected']
+
+    def queryset(self, request):
+        queryset = super(AccountAdmin, self).queryset(request)
+        return queryset._clone(klass=CountCachingQuerySet)
+
+    def selection_too_large(self, request, queryset):
+        # the actions call the providers within the request, a large
+        # selection would outlast it
+        limit = getattr(settings, 'ACCOUNTS_ADMIN_ACTION_LIMIT', 200)
+        if queryset.count() <= limit:
+            return False
+        self.message_user(
+            request,
+            u'Selecione no máximo {0} contas por vez. Para mais contas use '
+            u'./manage.py bulk_refresh_tokens.'.format(limit),
+            level=messages.ERROR
+        )
+        return True
+
+    def refresh_selected(self, request, queryset):
+        if self.selection_too_large(request, queryset):
+            return
+        report = bulk_refresh(
+            queryset.filter(provider__in=REFRESHABLE_PROVIDERS).exclude(refresh_token='')
+        )
+        self.message_user(request, u'{0} tokens renovados, {1} falhas.'.format(
+            report.refreshed, report.failed
+        ))
+    refresh_selected.short_description = u'Renovar os tokens das contas selecionadas'
+
+    def revoke_selected(self, request, queryset):
+        if self.selection_too_large(request, queryset):
+            return
+        report = revoke_tokens(queryset)
+        self.message_user(request, u'{0} contas revogadas, {1} falhas nos provedores.'.format(
+            report.refreshed, report.failed
+        ))
+    revoke_selected.short_description = u'Revogar os tokens das contas selecionadas'
+
+
+admin.site.register(Account, AccountAdmin)
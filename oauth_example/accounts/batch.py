@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from urllib import urlencode
+from urlparse import urljoin, urlparse
+import email
+import json
+import re
+import uuid
+
+from accounts.providers import get_provider, provider_url
+
+
+class BatchResponse(object):
+    # the answer to one request of a batch, filled by Batch.execute()
+
+    def __init__(self, method, url, params=None, data=None):
+        self.method = method.upper()
+        self.url = url
+        self.params = params or {}
+        self.data = data
+        self.status_code = None
+        self.headers = {}
+        self.content = None
+
+    @property
+    def ok(self):
+        return self.status_code is not None and self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def set(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class Batch(object):
+    """
+    Queues requests of one account and sends them in as few provider calls
+    as the provider allows:
+
+        batch = Batch(account)
+        me = batch.get('me')
+        feed = batch.get('me/feed', params={'limit': 10})
+        batch.execute()
+        me.json()
+
+    Facebook packs up to 50 requests in a Graph API batch, YouTube up to
+    1000 in a multipart/mixed batch, Twitter has no batches and gets one
+    call per request.
+    """
+
+    def __init__(self, account):
+        self.account = account
+        self.provider = get_provider(account.provider)
+        self.queue = []
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add(self, method, url, params=None, data=None):
+        response = BatchResponse(method, url, params, data)
+        self.queue.append(response)
+        return response
+
+    def get(self, url, params=None):
+        return self.add('GET', url, params)
+
+    def post(self, url, data=None, params=None):
+        return self.add('POST', url, params, data)
+
+    def execute(self):
+        client = self.account.get_client()
+        send = SENDERS.get(self.provider.batch_format, send_each)
+        queue, self.queue = self.queue, []
+        limit = max(self.provider.batch_limit, 1)
+        for start in range(0, len(queue), limit):
+            send(self.provider, client, queue[start:start + limit])
+        return queue
+
+
+def _path(provider, response):
+    # path and query of a request on the real provider host, relative urls
+    # start at the API root
+    url = urljoin(provider.endpoints['base_url'], response.url)
+    parts = urlparse(url)
+    path = parts.path
+    query = '&'.join(filter(None, [parts.query, urlencode(response.params)]))
+    return path + ('?' + query if query else '')
+
+
+def send_each(provider, client, responses):
+    for response in responses:
+        r = client.request(
+            response.method, provider_url(response.url),
+            params=response.params, data=response.data
+        )
+        response.set(r.status_code, dict(r.headers), r.content)
+
+
+def send_graph(provider, client, responses):
+    batch = []
+    for response in responses:
+        request = {
+            'method': response.method,
+            # relative to the graph root, without the leading slash
+            'relative_url': _path(provider, response)[1:],
+        }
+        if response.data:
+            request['body'] = urlencode(response.data)
+        batch.append(request)
+
+    r = client.post(provider_url(provider.batch_url), data={'batch': json.dumps(batch)})
+    r.raise_for_status()
+    for response, result in zip(responses, r.json()):
+        # null stands for a request that timed out inside the batch
+        if result is None:
+            continue
+        headers = dict((h['name'], h['value']) for h in result.get('headers') or [])
+        response.set(result['code'], headers, result.get('body'))
+
+
+def send_multipart(provider, client, responses):
+    boundary = 'batch_{0}'.format(uuid.uuid4().hex)
+    parts = []
+    for index, response in enumerate(responses):
+        request = '{0} {1} HTTP/1.1\r\n'.format(response.method, _path(provider, response))
+        if response.data is not None:
+            body = json.dumps(response.data)
+            request += 'Content-Type: application/json\r\n\r\n' + body
+        else:
+            request += '\r\n'
+        parts.append(
+            '--{0}\r\nContent-Type: application/http\r\nContent-ID: <item{1}>\r\n\r\n{2}\r\n'.format(
+                boundary, index, request
+            )
+        )
+    body = ''.join(parts) + '--{0}--\r\n'.format(boundary)
+
+    r = client.post(
+        provider_url(provider.batch_url),
+        data=body,
+        headers={'Content-Type': 'multipart/mixed; boundary=' + boundary}
+    )
+    r.raise_for_status()
+    for index, status, headers, content in parse_multipart(r.headers['Content-Type'], r.content):
+        if 0 <= index < len(responses):
+            responses[index].set(status, headers, content)
+
+
+def parse_multipart(content_type, content):
+    # yields (index, status, headers, body) of a multipart/mixed batch answer
+    message = email.message_from_string(
+        'Content-Type: {0}\n\n{1}'.format(content_type, content.replace('\r\n', '\n'))
+    )
+    for part in message.get_payload():
+        match = re.search(r'item(\d+)', part.get('Content-ID', ''))
+        if match is None:
+            continue
+        status_line, _, rest = part.get_payload().partition('\n')
+        inner = email.message_from_string(rest)
+        yield (
+            int(match.group(1)),
+            int(status_line.split()[1]),
+            dict(inner.items()),
+            inner.get_payload()
+        )
+
+
+SENDERS = {
+    'graph': send_graph,
+    'multipart': send_multipart,
+}
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
+from django.test.client import Client
+from django.test.utils import override_settings
+
+from datetime import datetime, timedelta
+from urlparse import urlparse, parse_qsl
+import resource
+import threading
+import time
+
+import requests
+
+from accounts.fakeprovider import (
+    FakeProvider, fake_provider_hosts, make_fake_provider_server
+)
+from accounts.models import Account
+from accounts.providers import PROVIDER_LIST
+from accounts.refresh import bulk_refresh
+from accounts.services import reset_services
+
+
+# hot paths of the accounts app, every scenario returns a result dict with
+# the same keys so runs of different versions can be compared
+SCENARIOS = ('account_list', 'callback', 'get_client', 'bulk_refresh')
+
+
+def _peak_rss_kb():
+    # monotonic for the process, so compare it between runs, not scenarios
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(round(p / 100.0 * (len(values) - 1)))]
+
+
+class Timer(object):
+    # times operations and counts the queries they run
+
+    def __init__(self, name, **params):
+        self.name = name
+        self.params = params
+        self.latencies = []
+        self.queries = 0
+
+    def __call__(self, func, *args, **kwargs):
+        queries = len(connection.queries)
+        started = time.time()
+        result = func(*args, **kwargs)
+        self.latencies.append(time.time() - started)
+        self.queries += len(connection.queries) - queries
+        return result
+
+    def result(self):
+        count = len(self.latencies)
+        elapsed = sum(self.latencies)
+        return {
+            'name': self.name,
+            'params': self.params,
+            'operations': count,
+            'ops_per_sec': count / elapsed if elapsed else 0.0,
+            'p50_ms': _percentile(self.latencies, 50) * 1000,
+            'p99_ms': _percentile(self.latencies, 99) * 1000,
+            'queries_per_op': float(self.queries) / count if count else 0.0,
+            'peak_rss_kb': _peak_rss_kb(),
+        }
+
+
+class FakeProviderServer(object):
+    # runs the fake provider in a thread and points the providers at it
+
+    def __enter__(self):
+        self.server = make_fake_provider_server(
+            '127.0.0.1', 0,
+            FakeProvider(twitter_callback_url=settings.TWITTER_CALLBACK_URL)
+        )
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        base = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.override = override_settings(ACCOUNTS_PROVIDER_HOSTS=fake_provider_hosts(base))
+        self.override.enable()
+        reset_services()
+        return self
+
+    def __exit__(self, *args):
+        self.override.disable()
+        reset_services()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _create_user(username):
+    User.objects.filter(username=username).delete()
+    return User.objects.create_user(username, username + '@email.com', '123456')
+
+
+def _create_accounts(user, count, provider='twitter', **fields):
+    batch = 1000
+    for start in range(0, count, batch):
+        Account.objects.bulk_create([
+            Account(
+                user=user,
+                provider=provider,
+                provider_id=str(i),
+                provider_username='user{0}'.format(i),
+                oauth_token='token{0}'.format(i),
+                oauth_token_secret='secret{0}'.format(i),
+                **fields
+            )
+            for i in range(start, min(start + batch, count))
+        ])
+
+
+def bench_account_list(sizes, iterations):
+    results = []
+    for size in sizes:
+        user = _create_user('bench_list')
+        _create_accounts(user, size)
+        client = Client()
+        client.login(username='bench_list', password='123456')
+        url = reverse('accounts_account_list')
+
+        for warm in (False, True):
+            timer = Timer('account_list', accounts=size, cached=warm)
+            cache.clear()
+            if warm:
+                client.get(url)
+            for i in range(iterations):
+                if not warm:
+                    cache.clear()
+                timer(client.get, url)
+            results.append(timer.result())
+        user.delete()
+    return results
+
+
+def bench_callback(iterations):
+    results = []
+    user = _create_user('bench_callback')
+    client = Client()
+    client.login(username='bench_callback', password='123456')
+    with FakeProviderServer():
+        for provider in PROVIDER_LIST:
+            timer = Timer('callback', provider=provider.name)
+            for i in range(iterations):
+                response = client.get(reverse(provider.new_url_name))
+                authorize = requests.get(response['Location'], allow_redirects=False)
+                params = dict(parse_qsl(urlparse(authorize.headers['Location']).query))
+                timer(client.get, reverse(provider.callback_url_name), params)
+            results.append(timer.result())
+    user.delete()
+    return results
+
+
+def bench_get_client(iterations):
+    results = []
+    for provider in PROVIDER_LIST:
+        account = Account(
+            provider=provider.name,
+            oauth_token='token',
+            oauth_token_secret='secret',
+            expires_in=datetime.now() + timedelta(hours=1)
+        )
+        timer = Timer('get_client', provider=provider.name)
+        for i in range(iterations):
+            timer(account.get_client)
+        results.append(timer.result())
+    return results
+
+
+def bench_bulk_refresh(size, workers=8):
+    user = _create_user('bench_refresh')
+    _create_accounts(
+        user, size, provider='youtube',
+        refresh_token='refresh', expires_in=datetime.now()
+    )
+    with FakeProviderServer():
+        queries = len(connection.queries)
+        report = bulk_refresh(Account.objects.filter(user=user), workers=workers)
+        queries = len(connection.queries) - queries
+    user.delete()
+    return [{
+        'name': 'bulk_refresh',
+        'params': {'accounts': size, 'workers': workers, 'failed': report.failed},
+        'operations': report.total,
+        'ops_per_sec': report.throughput,
+        'p50_ms': report.percentile(50) * 1000,
+        'p99_ms': report.percentile(99) * 1000,
+        'queries_per_op': float(queries) / report.total if report.total else 0.0,
+        'peak_rss_kb': _peak_rss_kb(),
+    }]
+
+
+def run_benchmarks(scenarios=SCENARIOS, sizes=(10, 1000, 100000), iterations=50, refresh_size=1000):
+    # connection.queries is only filled by the debug cursor, and emptied
+    # at the start of every request
+    use_debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    request_started.disconnect(reset_queries)
+    results = []
+    try:
+        if 'account_list' in scenarios:
+            results += bench_account_list(sizes, iterations)
+        if 'callback' in scenarios:
+            results += bench_callback(iterations)
+        if 'get_client' in scenarios:
+            results += bench_get_client(iterations * 100)
+        if 'bulk_refresh' in scenarios:
+            results += bench_bulk_refresh(refresh_size)
+    finally:
+        request_started.connect(reset_queries)
+        connection.use_debug_cursor = use_debug_cursor
+        reset_queries()
+    return results
+
+
+def result_key(result):
+    return (result['name'],) + tuple(sorted(result['params'].items()))
+
+
+def compare(previous, results):
+    # ops/sec and p99 change for every result also found in the previous run
+    previous = dict((result_key(result), result) for result in previous)
+    lines = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None or not old['ops_per_sec'] or not old['p99_ms']:
+            continue
+        lines.append((
+            result,
+            (result['ops_per_sec'] / old['ops_per_sec'] - 1) * 100,
+            (result['p99_ms'] / old['p99_ms'] - 1) * 100,
+        ))
+    return lines
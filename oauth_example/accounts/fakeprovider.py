@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+from urllib import urlencode
+from urlparse import parse_qs
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+import email
+import itertools
+import json
+import random
+import re
+import time
+
+
+# local stand-in for the endpoints used by accounts.providers, mount it with
+#
+#   ACCOUNTS_PROVIDER_HOSTS = fake_provider_hosts('http://127.0.0.1:8001')
+#
+# tokens are not validated, every token exchange creates a new user
+def fake_provider_hosts(base):
+    base = base.rstrip('/')
+    return {
+        'https://api.twitter.com': base + '/twitter',
+        'https://www.facebook.com': base + '/facebook',
+        'https://graph.facebook.com': base + '/facebook',
+        'https://accounts.google.com': base + '/google',
+        'https://www.googleapis.com': base + '/google',
+    }
+
+
+class FakeProvider(object):
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, twitter_callback_url=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.twitter_callback_url = twitter_callback_url
+        self.ids = itertools.count(1)
+        self.routes = {
+            '/twitter/oauth/request_token': self.twitter_request_token,
+            '/twitter/oauth/authorize': self.twitter_authorize,
+            '/twitter/oauth/access_token': self.twitter_access_token,
+            '/twitter/1.1/account/verify_credentials.json': self.twitter_profile,
+            '/facebook/': self.facebook_batch,
+            '/facebook/dialog/oauth': self.oauth2_authorize,
+            '/facebook/oauth/access_token': self.facebook_access_token,
+            '/facebook/me': self.facebook_profile,
+            '/facebook/me/permissions': self.revoke,
+            '/google/o/oauth2/auth': self.oauth2_authorize,
+            '/google/o/oauth2/token': self.google_token,
+            '/google/o/oauth2/revoke': self.revoke,
+            '/google/oauth2/v1/userinfo': self.google_profile,
+            '/google/batch/youtube/v3': self.google_batch,
+        }
+
+    def __call__(self, environ, start_response):
+        # simulated provider latency and failures
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.respond(start_response, '503 Service Unavailable', 'unavailable')
+
+        handler = self.routes.get(environ['PATH_INFO'])
+        if handler is None:
+            return self.respond(start_response, '404 Not Found', 'not found')
+
+        params = dict(
+            (key, values[0]) for key, values in
+            parse_qs(environ.get('QUERY_STRING', '')).items()
+        )
+        if environ['REQUEST_METHOD'] == 'POST':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length)
+            if environ.get('CONTENT_TYPE', '').startswith('multipart/'):
+                environ['fake.body'] = body
+            else:
+                params.update((key, values[0]) for key, values in parse_qs(body).items())
+        return handler(start_response, params, environ)
+
+    def subrequest(self, environ, method, path, query=''):
+        # runs one request of a batch, returns (status code, headers, body)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = headers
+
+        handler = self.routes.get(path)
+        sub_environ = dict(
+            environ, REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query,
+            CONTENT_LENGTH='0', CONTENT_TYPE=''
+        )
+        sub_environ['wsgi.input'] = StringIO('')
+        if handler is None:
+            body = self.respond(start_response, '404 Not Found', 'not found')
+        else:
+            params = dict((key, values[0]) for key, values in parse_qs(query).items())
+            body = handler(start_response, params, sub_environ)
+        return response['status'], response['headers'], ''.join(body)
+
+    def respond(self, start_response, status, body, content_type='text/plain', headers=()):
+        headers = [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(body))),
+        ] + list(headers)
+        start_response(status, headers)
+        return [body]
+
+    def json(self, start_response, data):
+        return self.respond(start_response, '200 OK', json.dumps(data), 'application/json')
+
+    def redirect(self, start_response, url, params):
+        separator = '&' if '?' in url else '?'
+        location = url + separator + urlencode(params)
+        return self.respond(start_response, '302 Found', '', headers=[('Location', location)])
+
+    def new_token(self, prefix):
+        return '{0}-{1}'.format(prefix, next(self.ids))
+
+    def user_id(self, token):
+        # the token carries the id of the fake user it belongs to
+        return int(token.rsplit('-', 1)[-1])
+
+    def bearer_token(self, environ, params):
+        authorization = environ.get('HTTP_AUTHORIZATION', '')
+        if authorization.startswith('Bearer '):
+            return authorization[len('Bearer '):]
+        return params.get('access_token', 'access-0')
+
+    # twitter, oauth 1.0a
+    def twitter_request_token(self, start_response, params, environ):
+        body = urlencode({
+            'oauth_token': self.new_token('request'),
+            'oauth_token_secret': 'request-secret',
+            'oauth_callback_confirmed': 'true',
+        })
+        return self.respond(start_response, '200 OK', body)
+
+    def twitter_authorize(self, start_response, params, environ):
+        return self.redirect(start_response, self.twitter_callback_url, {
+            'oauth_token': params.get('oauth_token', ''),
+            'oauth_verifier': 'verifier',
+        })
+
+    def twitter_access_token(self, start_response, params, environ):
+        token = self.new_token('access')
+        body = urlencode({
+            'oauth_token': token,
+            'oauth_token_secret': 'access-secret',
+            'user_id': self.user_id(token),
+        })
+        return self.respond(start_response, '200 OK', body)
+
+    def twitter_profile(self, start_response, params, environ):
+        # rauth signs in the query string unless header_auth is set
+        token = params.get('oauth_token', 'access-0')
+        authorization = environ.get('HTTP_AUTHORIZATION', '')
+        for part in authorization.split(','):
+            if 'oauth_token=' in part:
+                token = part.split('=', 1)[1].strip('" ')
+        user_id = self.user_id(token)
+        return self.json(start_response, {
+            'id': user_id,
+            'screen_name': 'fake{0}'.format(user_id),
+            'name': 'Fake User {0}'.format(user_id),
+        })
+
+    # facebook and google, oauth 2.0
+    def oauth2_authorize(self, start_response, params, environ):
+        return self.redirect(start_response, params.get('redirect_uri', '/'), {
+            'code': self.new_token('code'),
+        })
+
+    def facebook_access_token(self, start_response, params, environ):
+        body = urlencode({
+            'access_token': self.new_token('access'),
+            'expires': 5183999,
+        })
+        return self.respond(start_response, '200 OK', body)
+
+    def facebook_profile(self, start_response, params, environ):
+        user_id = self.user_id(self.bearer_token(environ, params))
+        return self.json(start_response, {
+            'id': str(user_id),
+            'username': 'fake{0}'.format(user_id),
+            'name': 'Fake User {0}'.format(user_id),
+        })
+
+    def revoke(self, start_response, params, environ):
+        return self.json(start_response, {'success': True})
+
+    def google_token(self, start_response, params, environ):
+        data = {
+            'access_token': self.new_token('access'),
+            'expires_in': 3600,
+            'token_type': 'Bearer',
+        }
+        if params.get('grant_type') == 'authorization_code':
+            data['refresh_token'] = self.new_token('refresh')
+        return self.json(start_response, data)
+
+    def facebook_batch(self, start_response, params, environ):
+        results = []
+        for request in json.loads(params.get('batch', '[]')):
+            path, _, query = request['relative_url'].partition('?')
+            status, headers, body = self.subrequest(
+                environ, request['method'], '/facebook/' + path, query
+            )
+            results.append({
+                'code': status,
+                'headers': [{'name': name, 'value': value} for name, value in headers],
+                'body': body,
+            })
+        return self.json(start_response, results)
+
+    def google_batch(self, start_response, params, environ):
+        content_type = environ.get('CONTENT_TYPE', '')
+        message = email.message_from_string('Content-Type: {0}\n\n{1}'.format(
+            content_type, environ.get('fake.body', '').replace('\r\n', '\n')
+        ))
+        boundary = 'batch_response'
+        parts = []
+        for part in message.get_payload():
+            index = re.search(r'item(\d+)', part.get('Content-ID', '')).group(1)
+            method, url = part.get_payload().split('\n', 1)[0].split()[:2]
+            path, _, query = url.partition('?')
+            status, headers, body = self.subrequest(environ, method, '/google' + path, query)
+            parts.append(
+                '--{0}\r\nContent-Type: application/http\r\n'
+                'Content-ID: <response-item{1}>\r\n\r\n'
+                'HTTP/1.1 {2} OK\r\n{3}\r\n\r\n{4}\r\n'.format(
+                    boundary, index, status,
+                    '\r\n'.join('{0}: {1}'.format(name, value) for name, value in headers),
+                    body
+                )
+            )
+        body = ''.join(parts) + '--{0}--\r\n'.format(boundary)
+        return self.respond(
+            start_response, '200 OK', body, 'multipart/mixed; boundary=' + boundary
+        )
+
+    def google_profile(self, start_response, params, environ):
+        user_id = self.user_id(self.bearer_token(environ, params))
+        return self.json(start_response, {
+            'id': str(user_id),
+            'email': 'fake{0}@example.com'.format(user_id),
+            'name': 'Fake User {0}'.format(user_id),
+        })
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def make_fake_provider_server(host, port, app, quiet=True):
+    return make_server(
+        host, port, app,
+        server_class=ThreadingWSGIServer,
+        handler_class=QuietHandler if quiet else WSGIRequestHandler
+    )
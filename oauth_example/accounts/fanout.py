@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+
+from collections import deque, namedtuple
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+import time
+
+from accounts import futures
+from accounts.providers import PROVIDER_LIST, provider_url
+
+
+FanOutResult = namedtuple('FanOutResult', 'account response error elapsed')
+
+
+def profile_endpoints():
+    # provider -> endpoint of the profile fetched by the callbacks
+    return dict((provider.name, provider.profile_url) for provider in PROVIDER_LIST)
+
+
+def get_limit(provider, limits=None):
+    limits = limits or getattr(settings, 'ACCOUNTS_FANOUT_LIMITS', {})
+    return limits.get(provider, getattr(settings, 'ACCOUNTS_FANOUT_LIMIT', 4))
+
+
+def _call(account, endpoint, method, kwargs, results):
+    started = time.time()
+    try:
+        url = endpoint(account) if callable(endpoint) else endpoint
+        # get_client() refreshes an expired token first
+        response = account.get_client().request(method, provider_url(url), **kwargs)
+    except Exception as e:
+        results.put(FanOutResult(account, None, e, time.time() - started))
+    else:
+        results.put(FanOutResult(account, response, None, time.time() - started))
+
+
+def fan_out(accounts, endpoints, method='GET', limits=None, **kwargs):
+    """
+    Calls the endpoint of each account's provider concurrently and yields a
+    FanOutResult per account as soon as its call finishes.
+
+    endpoints maps a provider name to a url, relative to the provider API or
+    absolute, or to a callable taking the account. Accounts of providers
+    without an endpoint are skipped. At most get_limit(provider) calls run
+    at once per provider, the others wait for a free slot.
+    """
+    queued = {}
+    for account in accounts:
+        if account.provider in endpoints:
+            queued.setdefault(account.provider, deque()).append(account)
+    if not queued:
+        return
+
+    results = Queue()
+    in_flight = dict((provider, 0) for provider in queued)
+    slots = dict((provider, get_limit(provider, limits)) for provider in queued)
+
+    pool = None
+    if not futures.cooperative():
+        pool = ThreadPool(sum(min(slots[p], len(queued[p])) for p in queued))
+
+    def start(provider):
+        while queued[provider] and in_flight[provider] < slots[provider]:
+            args = (queued[provider].popleft(), endpoints[provider], method, kwargs, results)
+            if pool is None:
+                futures.spawn(_call, *args)
+            else:
+                pool.apply_async(futures._run, (_call, args, {}))
+            in_flight[provider] += 1
+
+    try:
+        for provider in queued:
+            start(provider)
+        while any(in_flight.values()):
+            result = results.get()
+            provider = result.account.provider
+            in_flight[provider] -= 1
+            start(provider)
+            yield result
+    finally:
+        if pool is not None:
+            # a consumer that stops early leaves the running calls behind
+            pool.close()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.db import connection
+
+from multiprocessing.pool import ThreadPool
+import sys
+import threading
+
+
+def cooperative():
+    # true under oauth_example.gevent_wsgi or gunicorn -k gevent. A patched
+    # process has imported gevent already, the others do not pay for it
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('socket')
+
+
+_pool = {'pool': None}
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    with _pool_lock:
+        if _pool['pool'] is None:
+            _pool['pool'] = ThreadPool(getattr(settings, 'ACCOUNTS_CLIENT_WORKERS', 8))
+        return _pool['pool']
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # greenlets and pool threads each get their own connection
+        connection.close()
+
+
+def spawn(func, *args, **kwargs):
+    # runs func concurrently, returns something with .get(timeout=None):
+    # a greenlet when the process is monkey-patched, a pool result otherwise
+    if cooperative():
+        import gevent
+        return gevent.spawn(_run, func, args, kwargs)
+    return _get_pool().apply_async(_run, (func, args, kwargs))
+
+
+def get_client_async(account):
+    # the token refresh, if any, happens off the calling thread
+    return spawn(account.get_client)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+
+from collections import OrderedDict
+from urlparse import urljoin
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# describe the body of a 304, not the one kept
+UNMERGED_HEADERS = frozenset(['content-length', 'content-encoding', 'transfer-encoding'])
+
+# hits are answered from memory, revalidated ones got a 304
+_stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+
+class CachedEntry(object):
+
+    def __init__(self, response):
+        self.stored = time.time()
+        self.url = response.url
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.content = response.content
+        self.encoding = response.encoding
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+    @property
+    def revalidatable(self):
+        return bool(self.etag or self.last_modified)
+
+    def fresh(self, ttl):
+        return time.time() - self.stored < ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def revalidated(self, response):
+        # a 304 carries the current headers of the kept answer, besides the
+        # ones describing its own empty body. A copy, other threads may be
+        # serving this entry
+        headers = CaseInsensitiveDict(self.headers)
+        for name, value in response.headers.items():
+            if name.lower() not in UNMERGED_HEADERS:
+                headers[name] = value
+        self.headers = headers
+        self.etag = self.headers.get('ETag')
+        self.last_modified = self.headers.get('Last-Modified')
+        self.stored = time.time()
+
+    def response(self, request=None):
+        r = requests.Response()
+        r.status_code = 200
+        r.reason = 'OK'
+        r.url = self.url
+        r.headers = CaseInsensitiveDict(self.headers)
+        r._content = self.content
+        r.encoding = self.encoding
+        r.request = request
+        r.from_cache = True
+        return r
+
+
+class ResponseCache(object):
+    # process-wide LRU of provider GET answers, at most
+    # ACCOUNTS_HTTP_CACHE_SIZE entries and ACCOUNTS_HTTP_CACHE_MAX_BYTES of
+    # bodies
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        size = getattr(settings, 'ACCOUNTS_HTTP_CACHE_SIZE', 200)
+        max_bytes = getattr(settings, 'ACCOUNTS_HTTP_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.content)
+            while len(self._entries) > size or self._bytes > max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        # called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.content)
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for key in _stats:
+                _stats[key] = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def cache_stats():
+    with response_cache._lock:
+        return dict(_stats, entries=len(response_cache._entries), bytes=response_cache._bytes)
+
+
+def _incr(key):
+    with response_cache._lock:
+        _stats[key] += 1
+
+
+def cacheable(response):
+    if response.status_code != 200:
+        return False
+    if 'no-store' in response.headers.get('Cache-Control', ''):
+        return False
+    return len(response.content) <= getattr(settings, 'ACCOUNTS_HTTP_CACHE_MAX_BODY', 256 * 1024)
+
+
+class CachingMixin(object):
+    """
+    Conditional GETs for the sessions of Account.get_client(). Answers are
+    kept per account and url; within ACCOUNTS_HTTP_CACHE_TTL seconds they
+    are served from memory, after that they are revalidated with
+    If-None-Match/If-Modified-Since and a 304 serves the kept body.
+    """
+
+    account_id = None
+
+    def cache_key(self, url, params):
+        service = getattr(self, 'service', None)
+        base_url = getattr(service, 'base_url', None)
+        if base_url and '://' not in url:
+            url = urljoin(base_url, url)
+        prepared = requests.Request('GET', url, params=params).prepare()
+        return (self.account_id, prepared.url)
+
+    def _lookup(self, method, url, kwargs):
+        # (key, kept entry, answer from memory), no key for calls that are
+        # not cached
+        if (
+            method.upper() != 'GET' or self.account_id is None or kwargs.get('stream')
+            or not getattr(settings, 'ACCOUNTS_HTTP_CACHE', True)
+        ):
+            return None, None, None
+        key = self.cache_key(url, kwargs.get('params'))
+        entry = response_cache.get(key)
+        if entry is not None and entry.fresh(getattr(settings, 'ACCOUNTS_HTTP_CACHE_TTL', 0)):
+            _incr('hits')
+            return key, entry, entry.response()
+        return key, entry, None
+
+    def cached(self, method, url, **kwargs):
+        # the answer a call would get from memory, None when it would reach
+        # the provider
+        return self._lookup(method, url, kwargs)[2]
+
+    def request(self, method, url, **kwargs):
+        key, entry, r = self._lookup(method, url, kwargs)
+        if r is not None:
+            return r
+        if key is None:
+            return super(CachingMixin, self).request(method, url, **kwargs)
+
+        if entry is not None and entry.revalidatable:
+            headers = dict(kwargs.get('headers') or {})
+            headers.update(entry.conditional_headers())
+            kwargs['headers'] = headers
+
+        r = super(CachingMixin, self).request(method, url, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            _incr('revalidated')
+            entry.revalidated(r)
+            response_cache.set(key, entry)
+            return entry.response(r.request)
+
+        _incr('misses')
+        if cacheable(r):
+            entry = CachedEntry(r)
+            # without validators an entry is only useful while it is fresh
+            if entry.revalidatable or getattr(settings, 'ACCOUNTS_HTTP_CACHE_TTL', 0):
+                response_cache.set(key, entry)
+        elif entry is not None:
+            response_cache.delete(key)
+        return r
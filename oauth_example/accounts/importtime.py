@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Import cost per module, for ./manage.py profile_imports. Meant to run in a
+fresh interpreter, where nothing is imported yet:
+
+    python -m accounts.importtime oauth_example.wsgi
+
+A module with a WSGI application is profiled up to the point where it can
+answer, Django 1.5 loads the middleware and the urlconf on the first
+request.
+"""
+import __builtin__
+import sys
+import time
+
+
+class ImportProfiler(object):
+    # times every module loaded while active, the self time of a module
+    # leaves out the modules it imported
+
+    def __init__(self):
+        self.records = {}
+        self._stack = []
+        self._import = None
+
+    def __enter__(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self.profiled_import
+        return self
+
+    def __exit__(self, *exc_info):
+        __builtin__.__import__ = self._import
+
+    def module_names(self, name, globals, fromlist, level):
+        # the modules an import statement may load, python 2 tries a sibling
+        # module first and loads submodules named in the fromlist
+        globals = globals or {}
+        package = globals.get('__package__')
+        if package is None:
+            package = globals.get('__name__', '')
+            if not globals.get('__path__'):
+                package = package.rpartition('.')[0]
+        if level > 1:
+            package = package.rsplit('.', level - 1)[0]
+
+        if level > 0:
+            modules = [package + '.' + name if name else package]
+        elif level < 0 and package:
+            modules = [package + '.' + name, name]
+        else:
+            modules = [name]
+        modules = [
+            module for module in modules
+            if module in sys.modules or module == modules[-1]
+        ][:1]
+        modules.extend(modules[0] + '.' + item for item in fromlist or () if item != '*')
+        return modules
+
+    def profiled_import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        pending = [
+            module for module in self.module_names(name, globals, fromlist, level)
+            if sys.modules.get(module) is None
+        ]
+        if not pending:
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.0)
+        started = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - started
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            loaded = [module for module in pending if sys.modules.get(module) is not None]
+            if loaded:
+                self.records[', '.join(loaded)] = (elapsed - children, elapsed)
+
+    def top(self, limit=None):
+        # (module, self seconds, cumulative seconds), the slowest first
+        records = sorted(
+            ((name, own, total) for name, (own, total) in self.records.items()),
+            key=lambda record: record[2], reverse=True
+        )
+        return records[:limit] if limit else records
+
+
+def boot(target):
+    __import__(target)
+    application = getattr(sys.modules[target], 'application', None)
+    if getattr(application, 'load_middleware', None) is not None:
+        from django.conf import settings
+        application.load_middleware()
+        __import__(settings.ROOT_URLCONF)
+
+
+def profile(target):
+    with ImportProfiler() as profiler:
+        started = time.time()
+        boot(target)
+        elapsed = time.time() - started
+    return profiler, elapsed
+
+
+def timed(target):
+    started = time.time()
+    boot(target)
+    return time.time() - started
+
+
+def main(argv):
+    target = argv[1] if len(argv) > 1 else 'oauth_example.wsgi'
+    limit = int(argv[2]) if len(argv) > 2 else 30
+    if not limit:
+        # only the time, without the profiler overhead
+        print '{0:.1f}'.format(timed(target) * 1000)
+        return
+    profiler, elapsed = profile(target)
+    print '{0:>10} {1:>10}  module'.format('self ms', 'total ms')
+    for name, own, total in profiler.top(limit):
+        print '{0:>10.1f} {1:>10.1f}  {2}'.format(own * 1000, total * 1000, name)
+    print '{0} modules, {1:.0f}ms to import {2}'.format(len(profiler.records), elapsed * 1000, target)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.cache import cache
+
+from bisect import bisect_left
+import os
+import socket
+import threading
+import time
+
+
+# latency histogram bucket upper bounds, in milliseconds
+BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PROCESSES_KEY = 'accounts:stats:processes'
+
+_state = {
+    'enabled': getattr(settings, 'ACCOUNTS_INSTRUMENTATION', False),
+    'flushed': 0,
+}
+_stats = {}
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def enable(enabled=True):
+    _state['enabled'] = enabled
+
+
+def _process_key():
+    # computed on use, forked workers get their own key
+    return 'accounts:stats:{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+def _new_entry():
+    return {
+        'count': 0,
+        'errors': 0,
+        'sum_ms': 0.0,
+        'max_ms': 0.0,
+        'bytes': 0,
+        'buckets': [0] * (len(BUCKETS) + 1),
+        'status': {},
+    }
+
+
+def record(provider, endpoint, elapsed, status=None, size=0):
+    ms = elapsed * 1000
+    with _lock:
+        endpoints = _stats.setdefault(provider or 'unknown', {})
+        entry = endpoints.get(endpoint)
+        if entry is None:
+            entry = endpoints[endpoint] = _new_entry()
+        entry['count'] += 1
+        entry['sum_ms'] += ms
+        entry['max_ms'] = max(entry['max_ms'], ms)
+        entry['bytes'] += size
+        entry['buckets'][bisect_left(BUCKETS, ms)] += 1
+        if not status or status >= 500:
+            entry['errors'] += 1
+        status = str(status) if status else 'error'
+        entry['status'][status] = entry['status'].get(status, 0) + 1
+    _maybe_flush()
+
+
+def _copy(stats):
+    return dict(
+        (provider, dict(
+            (endpoint, dict(entry, buckets=list(entry['buckets']), status=dict(entry['status'])))
+            for endpoint, entry in endpoints.items()
+        ))
+        for provider, endpoints in stats.items()
+    )
+
+
+def snapshot():
+    from accounts.httpcache import cache_stats
+    from accounts.resilience import breaker_states
+    from accounts.sessions import pool_stats
+    with _lock:
+        calls = _copy(_stats)
+    return {
+        'calls': calls,
+        'pool': pool_stats(),
+        'cache': cache_stats(),
+        'breakers': breaker_states(),
+    }
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+    cache.delete(_process_key())
+
+
+def reset_all():
+    reset()
+    cache.delete_many(cache.get(PROCESSES_KEY) or [])
+    cache.delete(PROCESSES_KEY)
+
+
+# every process publishes its numbers to the cache, so the management
+# command and the JSON view can read them from any other process
+def _maybe_flush():
+    interval = getattr(settings, 'ACCOUNTS_INSTRUMENTATION_FLUSH_INTERVAL', 10)
+    now = time.time()
+    if now - _state['flushed'] >= interval:
+        _state['flushed'] = now
+        flush()
+
+
+def flush():
+    timeout = getattr(settings, 'ACCOUNTS_INSTRUMENTATION_TIMEOUT', 3600)
+    key = _process_key()
+    cache.set(key, snapshot(), timeout)
+    processes = cache.get(PROCESSES_KEY) or []
+    if key not in processes:
+        cache.set(PROCESSES_KEY, processes + [key], timeout)
+
+
+def _merge(total, calls):
+    for provider, endpoints in calls.items():
+        for endpoint, entry in endpoints.items():
+            merged = total.setdefault(provider, {}).setdefault(endpoint, _new_entry())
+            for key in ('count', 'errors', 'sum_ms', 'bytes'):
+                merged[key] += entry[key]
+            merged['max_ms'] = max(merged['max_ms'], entry['max_ms'])
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], entry['buckets'])]
+            for status, count in entry['status'].items():
+                merged['status'][status] = merged['status'].get(status, 0) + count
+
+
+def _percentile(buckets, count, p):
+    # upper bound of the bucket holding the percentile, None past the last
+    wanted = count * p / 100.0
+    seen = 0
+    for index, value in enumerate(buckets):
+        seen += value
+        if seen >= wanted:
+            return BUCKETS[index] if index < len(BUCKETS) else None
+    return None
+
+
+def collect():
+    # merges the snapshots of every live process, this one included
+    flush()
+    keys = cache.get(PROCESSES_KEY) or []
+    snapshots = cache.get_many(keys)
+
+    calls = {}
+    pool = {}
+    http_cache = {}
+    breakers = {}
+    for key in keys:
+        data = snapshots.get(key)
+        if data is None:
+            continue
+        _merge(calls, data['calls'])
+        for name, value in data['pool'].items():
+            pool[name] = pool.get(name, 0) + value
+        for name, value in data.get('cache', {}).items():
+            http_cache[name] = http_cache.get(name, 0) + value
+        # processes per breaker state and how often they opened
+        for provider, breaker in data.get('breakers', {}).items():
+            merged = breakers.setdefault(
+                provider, {'closed': 0, 'open': 0, 'half_open': 0, 'opened': 0}
+            )
+            merged[breaker['state']] += 1
+            merged['opened'] += breaker['opened']
+
+    for endpoints in calls.values():
+        for entry in endpoints.values():
+            entry['avg_ms'] = entry['sum_ms'] / entry['count'] if entry['count'] else 0.0
+            for p in (50, 90, 99):
+                entry['p{0}_ms'.format(p)] = _percentile(entry['buckets'], entry['count'], p)
+
+    return {
+        'enabled': is_enabled(),
+        'buckets_ms': list(BUCKETS),
+        'processes': len([key for key in keys if key in snapshots]),
+        'calls': calls,
+        'pool': pool,
+        'cache': http_cache,
+        'breakers': breakers,
+    }
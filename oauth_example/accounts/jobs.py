@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.db import connection
+
+from datetime import datetime, timedelta
+import logging
+
+from accounts.models import Account, AccountProfile, CallbackJob
+from accounts.providers import get_provider
+
+
+logger = logging.getLogger(__name__)
+
+
+def complete_job(job):
+    # token exchange, profile fetch and upsert of a queued callback
+    try:
+        provider = get_provider(job.provider)
+        tokens, profile = provider.complete(job.get_params())
+        account = Account.objects.upsert(
+            job.user,
+            provider.name,
+            profile['provider_id'],
+            provider_username=profile['provider_username'],
+            **tokens
+        )
+        AccountProfile.objects.store(account, profile['data'])
+    except Exception as e:
+        logger.exception(u'Error completing callback job %s', job.pk)
+        job.status = CallbackJob.FAILED
+        job.error = unicode(e)
+    else:
+        job.status = CallbackJob.DONE
+    finally:
+        # codes and verifiers are single use, no reason to keep them
+        job.params = ''
+        job.save(update_fields=['status', 'error', 'params', 'updated_on'])
+        # the worker thread owns its own connection
+        connection.close()
+    return job.status == CallbackJob.DONE
+
+
+def process_jobs(pool, batch=50):
+    # returns the number of completed and failed jobs
+    jobs = CallbackJob.objects.claim(batch)
+    results = pool.map(complete_job, jobs)
+    return results.count(True), results.count(False)
+
+
+def cleanup_jobs():
+    # jobs abandoned by a dead worker, their codes have expired by now
+    now = datetime.now()
+    stale = now - timedelta(seconds=getattr(settings, 'ACCOUNTS_CALLBACK_JOB_TIMEOUT', 300))
+    CallbackJob.objects.filter(status=CallbackJob.RUNNING, updated_on__lt=stale).update(
+        status=CallbackJob.FAILED, error=u'timeout', params='', updated_on=now
+    )
+
+    # finished jobs the user never came back to see
+    old = now - timedelta(seconds=getattr(settings, 'ACCOUNTS_CALLBACK_JOB_RETENTION', 86400))
+    CallbackJob.objects.filter(
+        status__in=[CallbackJob.DONE, CallbackJob.FAILED], updated_on__lt=old
+    ).delete()
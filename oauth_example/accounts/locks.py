@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+import threading
+
+
+class KeyedLock(object):
+    # one lock per key, dropped when no thread holds or waits on it
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def __call__(self, key):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def __len__(self):
+        with self._guard:
+            return len(self._locks)
+
+
+# serializes token refreshes of the same account inside this process
+refresh_lock = KeyedLock()
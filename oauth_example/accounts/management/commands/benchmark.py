@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from datetime import datetime
+from optparse import make_option
+import json
+import platform
+
+import django
+
+from accounts import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the accounts hot paths against a throwaway database'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--scenarios',
+            dest='scenarios',
+            default=','.join(benchmarks.SCENARIOS),
+            help='Comma separated scenarios to run'
+        ),
+        make_option(
+            '--sizes',
+            dest='sizes',
+            default='10,1000,100000',
+            help='Comma separated account counts for the account list'
+        ),
+        make_option(
+            '--iterations',
+            dest='iterations',
+            type='int',
+            default=50,
+            help='Requests per scenario'
+        ),
+        make_option(
+            '--refresh-size',
+            dest='refresh_size',
+            type='int',
+            default=1000,
+            help='Accounts refreshed by the bulk refresh scenario'
+        ),
+        make_option(
+            '--output',
+            dest='output',
+            default=None,
+            help='Save the results as JSON to this file'
+        ),
+        make_option(
+            '--compare',
+            dest='compare',
+            default=None,
+            help='Compare with the results saved by a previous run'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError(u'Unknown scenarios: {0}'.format(u', '.join(sorted(unknown))))
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)['results']
+
+        results = self.run(scenarios, sizes, options)
+
+        self.stdout.write(u'{0:14} {1:36} {2:>7} {3:>9} {4:>9} {5:>9} {6:>9} {7:>10}'.format(
+            'scenario', 'params', 'ops', 'ops/s', 'p50 ms', 'p99 ms', 'queries', 'rss kb'
+        ))
+        for result in results:
+            self.stdout.write(u'{0:14} {1:36} {2:>7} {3:>9.1f} {4:>9.2f} {5:>9.2f} {6:>9.1f} {7:>10}'.format(
+                result['name'], _params(result)[:36], result['operations'],
+                result['ops_per_sec'], result['p50_ms'], result['p99_ms'],
+                result['queries_per_op'], result['peak_rss_kb']
+            ))
+
+        if previous is not None:
+            self.stdout.write(u'\nchanges since {0}:'.format(options['compare']))
+            for result, throughput, p99 in benchmarks.compare(previous, results):
+                self.stdout.write(u'{0:14} {1:36} ops/s {2:+7.1f}% p99 {3:+7.1f}%'.format(
+                    result['name'], _params(result)[:36], throughput, p99
+                ))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_on': datetime.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'results': results,
+                }, f, indent=2)
+
+    def run(self, scenarios, sizes, options):
+        # the scenarios create and delete lots of rows, keep them away from
+        # the real database
+        from south.management.commands import patch_for_test_db_setup
+        patch_for_test_db_setup()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            return benchmarks.run_benchmarks(
+                scenarios, sizes, options['iterations'], options['refresh_size']
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def _params(result):
+    return u' '.join(u'{0}={1}'.format(k, v) for k, v in sorted(result['params'].items()))
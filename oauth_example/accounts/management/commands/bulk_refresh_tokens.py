@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from datetime import timedelta
+from optparse import make_option
+
+from accounts.models import Account, REFRESHABLE_PROVIDERS, TOKEN_EXPIRY_MARGIN
+from accounts.refresh import bulk_refresh
+
+
+class Command(BaseCommand):
+    help = 'Refreshes tokens in bulk on a thread pool'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--workers',
+            type='int',
+            default=8,
+            help='Concurrent refresh requests'
+        ),
+        make_option(
+            '--chunk-size',
+            dest='chunk_size',
+            type='int',
+            default=500,
+            help='Accounts loaded and written back per batch'
+        ),
+        make_option(
+            '--window',
+            type='int',
+            default=0,
+            help='Minutes ahead of the expiry margin to look for tokens'
+        ),
+        make_option(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Refresh every refreshable account, expiring or not'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            queryset = Account.objects.filter(
+                provider__in=REFRESHABLE_PROVIDERS
+            ).exclude(refresh_token='')
+        else:
+            queryset = Account.objects.expiring(
+                TOKEN_EXPIRY_MARGIN + timedelta(minutes=options['window'])
+            )
+
+        report = bulk_refresh(
+            queryset,
+            workers=options['workers'],
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(unicode(report))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from optparse import make_option
+
+from accounts.models import Account
+from accounts.transfer import export_accounts, open_file
+
+
+class Command(BaseCommand):
+    args = '<file.jsonl.gz>'
+    help = 'Writes the accounts to a JSON Lines file, gzipped if it ends in .gz'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--provider',
+            action='append',
+            dest='providers',
+            default=[],
+            help='Only accounts of this provider, may be repeated'
+        ),
+        make_option(
+            '--chunk-size',
+            dest='chunk_size',
+            type='int',
+            default=5000,
+            help='Accounts read per query'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: export_accounts {0}'.format(self.args))
+
+        queryset = Account.objects.all()
+        if options['providers']:
+            queryset = queryset.filter(provider__in=options['providers'])
+
+        with open_file(args[0], 'w') as fileobj:
+            report = export_accounts(fileobj, queryset, options['chunk_size'])
+        self.stdout.write(unicode(report))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from optparse import make_option
+
+from accounts.transfer import import_accounts, open_file
+
+
+class Command(BaseCommand):
+    args = '<file.jsonl.gz>'
+    help = 'Creates the accounts of a file written by export_accounts'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--chunk-size',
+            dest='chunk_size',
+            type='int',
+            default=5000,
+            help='Accounts written per transaction'
+        ),
+        make_option(
+            '--update',
+            action='store_true',
+            dest='update',
+            default=False,
+            help='Overwrite the tokens of accounts that already exist'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: import_accounts {0}'.format(self.args))
+
+        with open_file(args[0], 'r') as fileobj:
+            report = import_accounts(fileobj, options['chunk_size'], options['update'])
+        self.stdout.write(unicode(report))
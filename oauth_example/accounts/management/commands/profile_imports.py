@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from optparse import make_option
+import os
+import subprocess
+import sys
+import time
+
+
+class Command(BaseCommand):
+    args = '[module ...]'
+    help = 'Reports the import time per module of a cold start, in fresh interpreters'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--limit',
+            type='int',
+            default=30,
+            help='Slowest modules listed per target'
+        ),
+        make_option(
+            '--runs',
+            type='int',
+            default=5,
+            help='Cold starts timed per target, the best and the median are shown'
+        ),
+        make_option(
+            '--command',
+            action='append',
+            dest='commands',
+            default=[],
+            help='Also time whole "manage.py <command>" processes, may be repeated'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        targets = args or ('oauth_example.wsgi', 'accounts.models')
+        self.project_path = os.path.dirname(settings.PROJECT_PATH)
+        self.env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'oauth_example.settings'
+        ))
+
+        for target in targets:
+            self.stdout.write(u'== {0}'.format(target))
+            self.stdout.write(self.run('-m', 'accounts.importtime', target, str(options['limit'])))
+            if options['runs']:
+                timings = [
+                    float(self.run('-m', 'accounts.importtime', target, '0'))
+                    for i in range(options['runs'])
+                ]
+                self.stdout.write(self.summary(u'cold start of {0}'.format(target), timings))
+
+        for command in options['commands']:
+            timings = []
+            for i in range(max(options['runs'], 1)):
+                started = time.time()
+                self.run('manage.py', *command.split())
+                timings.append((time.time() - started) * 1000)
+            self.stdout.write(self.summary(u'manage.py {0}, whole process'.format(command), timings))
+
+    def run(self, *args):
+        process = subprocess.Popen(
+            (sys.executable,) + args, cwd=self.project_path, env=self.env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        stdout, stderr = process.communicate()
+        if process.returncode:
+            raise CommandError(stderr.strip().splitlines()[-1] if stderr.strip() else args)
+        return stdout.rstrip('\n')
+
+    def summary(self, label, timings):
+        timings = sorted(timings)
+        return u'{0}: best {1:.0f}ms, median {2:.0f}ms over {3} runs\n'.format(
+            label, timings[0], timings[len(timings) // 2], len(timings)
+        )
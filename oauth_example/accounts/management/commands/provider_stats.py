@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from optparse import make_option
+import json
+
+from accounts import instrumentation
+
+
+class Command(BaseCommand):
+    help = 'Shows latency, status codes and bytes of the provider calls'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--json',
+            action='store_true',
+            dest='json',
+            default=False,
+            help='Print the raw numbers as JSON'
+        ),
+        make_option(
+            '--reset',
+            action='store_true',
+            dest='reset',
+            default=False,
+            help='Forget the numbers published by every process'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            instrumentation.reset_all()
+            return
+
+        stats = instrumentation.collect()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        self.stdout.write(u'{0:10} {1:40} {2:>7} {3:>6} {4:>8} {5:>8} {6:>8} {7:>10}'.format(
+            'provider', 'endpoint', 'calls', 'errors', 'p50 ms', 'p99 ms', 'max ms', 'bytes'
+        ))
+        for provider, endpoints in sorted(stats['calls'].items()):
+            for endpoint, entry in sorted(endpoints.items()):
+                self.stdout.write(u'{0:10} {1:40} {2:>7} {3:>6} {4:>8} {5:>8} {6:>8.0f} {7:>10}'.format(
+                    provider, endpoint[:40], entry['count'], entry['errors'],
+                    _bound(entry['p50_ms']), _bound(entry['p99_ms']),
+                    entry['max_ms'], entry['bytes']
+                ))
+        self.stdout.write(u'pool: {0}'.format(
+            u', '.join(u'{0}={1}'.format(k, v) for k, v in sorted(stats['pool'].items()))
+        ))
+        self.stdout.write(u'cache: {0}'.format(
+            u', '.join(u'{0}={1}'.format(k, v) for k, v in sorted(stats['cache'].items()))
+        ))
+        for provider, breaker in sorted(stats['breakers'].items()):
+            self.stdout.write(u'breaker {0}: {1}'.format(
+                provider,
+                u', '.join(u'{0}={1}'.format(k, v) for k, v in sorted(breaker.items()))
+            ))
+
+
+def _bound(value):
+    return u'<={0}'.format(value) if value is not None else u'>10000'
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from optparse import make_option
+import time
+
+from accounts.profiles import refresh_profiles
+
+
+class Command(BaseCommand):
+    help = 'Fetches again the provider profiles whose snapshot is stale'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--max-age',
+            dest='max_age',
+            type='int',
+            default=None,
+            help='Seconds a snapshot stays fresh (defaults to ACCOUNTS_PROFILE_TTL)'
+        ),
+        make_option(
+            '--chunk-size',
+            dest='chunk_size',
+            type='int',
+            default=500,
+            help='Accounts loaded per batch'
+        ),
+        make_option(
+            '--interval',
+            type='int',
+            default=0,
+            help='Minutes between runs, 0 runs once and exits'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            report = refresh_profiles(
+                max_age=options['max_age'],
+                chunk_size=options['chunk_size']
+            )
+            self.stdout.write(unicode(report))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'] * 60)
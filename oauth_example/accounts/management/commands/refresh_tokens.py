@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from datetime import timedelta
+from optparse import make_option
+import time
+
+from accounts.models import Account, TOKEN_EXPIRY_MARGIN
+from accounts.refresh import bulk_refresh
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the tokens that will expire soon, ahead of get_client()'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--window',
+            type='int',
+            default=None,
+            help='Minutes ahead of the expiry margin to look for tokens '
+                 '(defaults to the interval)'
+        ),
+        make_option(
+            '--interval',
+            type='int',
+            default=0,
+            help='Minutes between runs, 0 runs once and exits'
+        ),
+        make_option(
+            '--workers',
+            type='int',
+            default=4,
+            help='Concurrent refresh requests'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        window = options['window']
+        if window is None:
+            window = interval
+
+        # a token must be refreshed before it enters the margin used by
+        # is_expired, otherwise get_client would refresh it inline
+        margin = TOKEN_EXPIRY_MARGIN + timedelta(minutes=window)
+
+        while True:
+            report = bulk_refresh(
+                Account.objects.expiring(margin),
+                workers=options['workers']
+            )
+            self.stdout.write(unicode(report))
+            if not interval:
+                break
+            time.sleep(interval * 60)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+import time
+
+from accounts.jobs import process_jobs, cleanup_jobs
+
+
+class Command(BaseCommand):
+    help = 'Completes the callbacks queued while ACCOUNTS_ASYNC_CALLBACKS is on'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--workers',
+            type='int',
+            default=8,
+            help='Callbacks completed concurrently'
+        ),
+        make_option(
+            '--batch',
+            type='int',
+            default=50,
+            help='Jobs claimed at a time'
+        ),
+        make_option(
+            '--interval',
+            type='float',
+            default=1,
+            help='Seconds to wait when the queue is empty'
+        ),
+        make_option(
+            '--once',
+            action='store_true',
+            default=False,
+            help='Empty the queue and exit'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        pool = ThreadPool(options['workers'])
+        try:
+            while True:
+                cleanup_jobs()
+                done, failed = process_jobs(pool, options['batch'])
+                if done or failed:
+                    self.stdout.write(u'{0} callbacks completed, {1} failures'.format(done, failed))
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from optparse import make_option
+import pprint
+
+from accounts.fakeprovider import (
+    FakeProvider, fake_provider_hosts, make_fake_provider_server
+)
+
+
+class Command(BaseCommand):
+    help = 'Runs a local stand-in for the Twitter, Facebook and Google endpoints'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--host', default='127.0.0.1'),
+        make_option('--port', type='int', default=8001),
+        make_option(
+            '--latency',
+            type='int',
+            default=0,
+            help='Milliseconds added to every response'
+        ),
+        make_option(
+            '--jitter',
+            type='int',
+            default=0,
+            help='Random milliseconds added or removed from the latency'
+        ),
+        make_option(
+            '--error-rate',
+            dest='error_rate',
+            type='float',
+            default=0,
+            help='Fraction of the requests answered with 503, from 0 to 1'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        app = FakeProvider(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            twitter_callback_url=settings.TWITTER_CALLBACK_URL
+        )
+        server = make_fake_provider_server(
+            options['host'], options['port'], app,
+            quiet=int(options['verbosity']) < 2
+        )
+
+        base = 'http://{0}:{1}'.format(options['host'], options['port'])
+        self.stdout.write(u'Fake provider listening on {0}, point the app at it with:\n'.format(base))
+        self.stdout.write(u'ACCOUNTS_PROVIDER_HOSTS = {0}\n'.format(
+            pprint.pformat(fake_provider_hosts(base))
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
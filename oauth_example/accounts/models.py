@@ -1,69 +1,144 @@
 # -*- coding: utf-8 -*-
-from django.db import models
+from django.db import models, transaction, connections, IntegrityError
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.conf import settings
 
-from rauth import OAuth1Service, OAuth2Service
-import requests
 from datetime import datetime, timedelta
+import json
+import sqlite3
+import uuid
 
+from accounts.locks import refresh_lock
+from accounts.providers import PROVIDERS, PROVIDER_LIST
+from accounts.services import get_service
 
-# Api keys
-TWITTER_KEY = settings.TWITTER_KEY
-TWITTER_SECRET = settings.TWITTER_SECRET
-TWITTER_CALLBACK_URL = settings.TWITTER_CALLBACK_URL
 
-FACEBOOK_APP_ID = settings.FACEBOOK_APP_ID 
-FACEBOOK_APP_SECRET = settings.FACEBOOK_APP_SECRET
-FACEBOOK_CALLBACK_URL = settings.FACEBOOK_CALLBACK_URL
-
-YOUTUBE_CLIENT_ID = settings.YOUTUBE_CLIENT_ID 
-YOUTUBE_CLIENT_SECRET = settings.YOUTUBE_CLIENT_SECRET
-YOUTUBE_CALLBACK_URL = settings.YOUTUBE_CALLBACK_URL
-
-
-# rauth sessions
+# rauth services, built once per process by their provider
 def get_twitter_service():
-    twitter = OAuth1Service(
-        consumer_key=TWITTER_KEY,
-        consumer_secret=TWITTER_SECRET,
-        name='twitter',
-        access_token_url='https://api.twitter.com/oauth/access_token',
-        authorize_url='https://api.twitter.com/oauth/authorize',
-        request_token_url='https://api.twitter.com/oauth/request_token',
-        base_url='https://api.twitter.com/1.1/'
-    )
-    return twitter
+    return get_service('twitter')
 
 def get_facebook_service():
-    facebook = OAuth2Service(
-        client_id=FACEBOOK_APP_ID,
-        client_secret=FACEBOOK_APP_SECRET,
-        name='facebook',
-        authorize_url='https://www.facebook.com/dialog/oauth',
-        access_token_url='https://graph.facebook.com/oauth/access_token',
-        base_url='https://graph.facebook.com/'
-    )
-    return facebook
+    return get_service('facebook')
 
 def get_youtube_service():
-    youtube = OAuth2Service(
-        client_id=YOUTUBE_CLIENT_ID,
-        client_secret=YOUTUBE_CLIENT_SECRET,
-        name='youtube',
-        authorize_url='https://accounts.google.com/o/oauth2/auth',
-        access_token_url='https://accounts.google.com/o/oauth2/token',
-        base_url='https://www.googleapis.com/youtube/v3/'
-    )
-    return youtube
+    return get_service('youtube')
 
 
-PROVIDER_CHOICES = (
-    (u'twitter', u'Twitter'),
-    (u'facebook', u'Facebook'),
-    (u'youtube', u'Youtube'),
+PROVIDER_CHOICES = tuple(
+    (provider.name, provider.label) for provider in PROVIDER_LIST
+)
+
+# providers whose tokens can be refreshed without the user
+REFRESHABLE_PROVIDERS = tuple(
+    provider.name for provider in PROVIDER_LIST if provider.refreshable
 )
 
+# a token is treated as expired this long before its real expiry
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=10)
+
+
+class AccountManager(models.Manager):
+
+    def expiring(self, window=TOKEN_EXPIRY_MARGIN):
+        # uses the (provider, expires_in) index
+        return self.filter(
+            provider__in=REFRESHABLE_PROVIDERS,
+            expires_in__lte=datetime.now() + window
+        ).exclude(refresh_token='')
+
+    def stale_profiles(self, max_age=None):
+        # accounts without a profile snapshot or with one older than max_age
+        if max_age is None:
+            max_age = getattr(settings, 'ACCOUNTS_PROFILE_TTL', 86400)
+        return self.filter(
+            Q(profile__isnull=True) |
+            Q(profile__fetched_on__lt=datetime.now() - timedelta(seconds=max_age))
+        )
+
+    def upsert(self, user, provider, provider_id, **fields):
+        # creates or updates the account of (user, provider, provider_id)
+        fields['updated_on'] = datetime.now()
+        connection = connections[self.db]
+        if _supports_upsert(connection):
+            return self._upsert_statement(
+                connection, user, provider, provider_id, fields
+            )
+
+        # user may be a User or its pk, as in ./manage.py import_accounts
+        user_id = getattr(user, 'pk', user)
+        lookup = {'user_id': user_id, 'provider': provider, 'provider_id': provider_id}
+        with transaction.commit_on_success(using=self.db):
+            if not self.filter(**lookup).update(**fields):
+                sid = transaction.savepoint(using=self.db)
+                try:
+                    self.create(**dict(lookup, **fields))
+                    transaction.savepoint_commit(sid, using=self.db)
+                except IntegrityError:
+                    # lost the race to a concurrent insert
+                    transaction.savepoint_rollback(sid, using=self.db)
+                    self.filter(**lookup).update(**fields)
+            account = self.get(**lookup)
+        # update() sends no post_save
+        invalidate_account_list(user_id)
+        return account
+
+    def _upsert_statement(self, connection, user, provider, provider_id, fields):
+        # INSERT ... ON CONFLICT DO UPDATE ... RETURNING, one round-trip
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        values = dict(fields, provider=provider, provider_id=provider_id)
+        values['user'] = getattr(user, 'pk', user)
+        values['created_on'] = values['updated_on']
+
+        insert_fields = [f for f in opts.local_fields if not f.primary_key]
+        params = []
+        for field in insert_fields:
+            if field.name in values:
+                value = values[field.name]
+            else:
+                value = field.get_default()
+            params.append(field.get_db_prep_save(value, connection=connection))
+
+        conflict = ('user', 'provider', 'provider_id')
+        keep = conflict + ('created_on',)
+        sql = 'INSERT INTO {0} ({1}) VALUES ({2}) ON CONFLICT ({3}) DO UPDATE SET {4} RETURNING {5}'.format(
+            qn(opts.db_table),
+            ', '.join(qn(f.column) for f in insert_fields),
+            ', '.join(['%s'] * len(insert_fields)),
+            ', '.join(qn(opts.get_field(name).column) for name in conflict),
+            ', '.join(
+                '{0} = EXCLUDED.{0}'.format(qn(f.column)) for f in insert_fields
+                if f.name in values and f.name not in keep
+            ),
+            ', '.join(qn(f.column) for f in opts.fields)
+        )
+
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        transaction.commit_unless_managed(using=self.db)
+
+        # raw statements do not send post_save
+        invalidate_account_list(values['user'])
+
+        account = self.model(*row)
+        account._state.adding = False
+        account._state.db = self.db
+        return account
+
+
+def _supports_upsert(connection):
+    if connection.vendor == 'postgresql':
+        return connection.pg_version >= 90500
+    if connection.vendor == 'sqlite':
+        # RETURNING arrived in sqlite 3.35
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return False
+
 
 class Account(models.Model):
 
@@ -87,7 +162,8 @@ class Account(models.Model):
 
     provider_username = models.CharField(
         u'Login no Provedor',
-        max_length=100
+        max_length=100,
+        db_index=True
     )
 
     oauth_token = models.CharField(
@@ -107,12 +183,22 @@ class Account(models.Model):
 
     expires_in = models.DateTimeField(
         u'Expires in',
-        null=True
+        null=True,
+        db_index=True
     )
 
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
+    objects = AccountManager()
+
+    def __eq__(self, other):
+        # instances loaded with .only() belong to a deferred subclass
+        return isinstance(other, Account) and self._get_pk_val() == other._get_pk_val()
+
+    def __hash__(self):
+        return hash(self._get_pk_val())
+
     def __unicode__(self):
         return u'Provedor: {0} - Login: {1}'.format(
             self.provider, self.provider_username
@@ -121,49 +207,323 @@ class Account(models.Model):
     class Meta:
         verbose_name = u'Conta'
         verbose_name_plural = u'Contas'
+        index_together = [['provider', 'expires_in']]
+        unique_together = [['user', 'provider', 'provider_id']]
 
-    def is_expired(self):
+    def is_expired(self, margin=TOKEN_EXPIRY_MARGIN):
         if self.expires_in:
-            return datetime.now() > self.expires_in - timedelta(minutes=10)
+            return datetime.now() > self.expires_in - margin
         return False
 
-    def get_client(self):
-        client = None
-
-        if self.provider == 'twitter':
-            client = get_twitter_service().get_session(
-                token=(self.oauth_token, self.oauth_token_secret)
-            )
-        elif self.provider == 'facebook':
-            client = get_facebook_service().get_session(
-                token=self.oauth_token
-            )
-        elif self.provider == 'youtube':
-            self.google_refresh_token()
-            client = get_youtube_service().get_session(
-                token=self.oauth_token
+    def get_client(self, stale_while_revalidate=None):
+        if stale_while_revalidate is None:
+            stale_while_revalidate = getattr(
+                settings, 'ACCOUNTS_STALE_WHILE_REVALIDATE', False
             )
 
+        provider = PROVIDERS.get(self.provider)
+        if provider is None:
+            return None
+
+        # no point in handing out a client for a provider that is down
+        if not provider.breaker.available():
+            from accounts.resilience import ProviderUnavailable
+            raise ProviderUnavailable(provider.name)
+
+        if provider.refreshable:
+            # inside the margin the current token still works, so it can be
+            # used right away while a background thread refreshes it
+            if stale_while_revalidate and self.pk and not self.is_expired(timedelta(0)):
+                if self.is_expired():
+                    from accounts.refresh import refresh_in_background
+                    refresh_in_background(self)
+            else:
+                self.google_refresh_token()
+
+        client = provider.get_session(self)
+        # keys the conditional GET cache of the session
+        client.account_id = self.pk
         return client
 
-    def google_refresh_token(self):
-        client_id = YOUTUBE_CLIENT_ID
-        client_secret = YOUTUBE_CLIENT_SECRET
-        if self.is_expired():
-            # make payload and set url
-            payload = {
-                'client_id': client_id,
-                'client_secret': client_secret,
-                'refresh_token': self.refresh_token,
-                'grant_type': 'refresh_token'
-            }
-            url = 'https://accounts.google.com/o/oauth2/token'
-
-            # make request
-            r = requests.post(url, data=payload)
-            data = r.json()
-            self.access_token = data['access_token']
-            self.expires_in = datetime.now() + timedelta(seconds=int(data['expires_in']))
-
-            # save social account
+    def get_client_async(self):
+        # .get() on the result waits for the client
+        from accounts.futures import get_client_async
+        return get_client_async(self)
+
+    def get_rate_limited_client(self, max_wait=None):
+        # calls wait for this account's budget on their endpoint
+        from accounts.ratelimit import RateLimitedClient
+        return RateLimitedClient(self, max_wait)
+
+    def batch(self):
+        # requests queued and sent in provider batch calls
+        from accounts.batch import Batch
+        return Batch(self)
+
+    def paginate(self, url, params=None, max_pages=None):
+        # items of a provider listing, fetched page by page
+        from accounts.pagination import iter_items
+        return iter_items(self, url, params, max_pages)
+
+    def google_refresh_token(self, margin=TOKEN_EXPIRY_MARGIN):
+        if not self.is_expired(margin):
+            return False
+
+        provider = PROVIDERS[self.provider]
+        if self.pk is None:
+            self.oauth_token, self.expires_in = \
+                provider.refresh_access_token(self.refresh_token)
             self.save()
+            return True
+
+        # single-flight: threads of this process wait on the account lock
+        # and other processes on the row lock, whoever comes second reuses
+        # the token the first one stored
+        with refresh_lock(self.pk):
+            with transaction.commit_on_success():
+                account = Account.objects.select_for_update().get(pk=self.pk)
+                if account.is_expired(margin):
+                    account.oauth_token, account.expires_in = \
+                        provider.refresh_access_token(account.refresh_token)
+                    account.save(update_fields=['oauth_token', 'expires_in', 'updated_on'])
+
+        self.oauth_token = account.oauth_token
+        self.expires_in = account.expires_in
+        self.updated_on = account.updated_on
+        return True
+
+
+class AccountProfileManager(models.Manager):
+
+    def store(self, account, data):
+        # creates or replaces the snapshot of the account from the provider
+        # profile, as fetched by the callback or by ./manage.py refresh_profiles
+        fields = PROVIDERS[account.provider].map_snapshot(data)
+        fields['data'] = json.dumps(data)
+        fields['fetched_on'] = datetime.now()
+        with transaction.commit_on_success(using=self.db):
+            if self.filter(account=account).update(**fields):
+                # the list cache is dropped by post_save, update() skips it
+                invalidate_account_list(account.user_id)
+                return self.get(account=account)
+            sid = transaction.savepoint(using=self.db)
+            try:
+                profile = self.create(account=account, **fields)
+                transaction.savepoint_commit(sid, using=self.db)
+            except IntegrityError:
+                # lost the race to a concurrent insert
+                transaction.savepoint_rollback(sid, using=self.db)
+                self.filter(account=account).update(**fields)
+                profile = self.get(account=account)
+                invalidate_account_list(account.user_id)
+            return profile
+
+
+class AccountProfile(models.Model):
+    # what the pages show of the provider profile, so they render without
+    # calling the provider
+
+    account = models.OneToOneField(
+        Account,
+        verbose_name=u'Conta',
+        related_name='profile'
+    )
+
+    name = models.CharField(u'Nome', max_length=200, blank=True)
+
+    picture = models.URLField(u'Foto', max_length=500, blank=True)
+
+    followers = models.PositiveIntegerField(u'Seguidores', null=True, blank=True)
+
+    # the whole provider answer as JSON
+    data = models.TextField(u'Dados', blank=True)
+
+    fetched_on = models.DateTimeField(u'Obtido em', db_index=True)
+
+    objects = AccountProfileManager()
+
+    def __unicode__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = u'Perfil'
+        verbose_name_plural = u'Perfis'
+
+    def get_data(self):
+        return json.loads(self.data) if self.data else {}
+
+
+class CallbackJobManager(models.Manager):
+
+    def enqueue(self, user, provider, params):
+        return self.create(user=user, provider=provider, params=json.dumps(params))
+
+    def claim(self, limit):
+        # the conditional update makes sure a job goes to a single worker
+        jobs = []
+        pks = self.filter(status=CallbackJob.PENDING).order_by('pk').values_list('pk', flat=True)
+        for pk in list(pks[:limit]):
+            if self.filter(pk=pk, status=CallbackJob.PENDING).update(
+                status=CallbackJob.RUNNING, updated_on=datetime.now()
+            ):
+                jobs.append(pk)
+        transaction.commit_unless_managed(using=self.db)
+        return list(self.filter(pk__in=jobs).select_related('user').order_by('pk'))
+
+
+class CallbackJob(models.Model):
+    # a callback waiting for the token exchange and profile fetch, done by
+    # ./manage.py run_callback_worker when ACCOUNTS_ASYNC_CALLBACKS is on
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, u'Pendente'),
+        (RUNNING, u'Em andamento'),
+        (DONE, u'Concluída'),
+        (FAILED, u'Falhou'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=u'Usuário',
+        related_name='callback_jobs'
+    )
+
+    provider = models.CharField(
+        u'Provedor',
+        max_length=20,
+        choices=PROVIDER_CHOICES
+    )
+
+    # callback params as JSON, cleared once the job is finished
+    params = models.TextField(u'Parâmetros', blank=True)
+
+    status = models.CharField(
+        u'Situação',
+        max_length=10,
+        db_index=True,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    error = models.TextField(u'Erro', blank=True)
+
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    objects = CallbackJobManager()
+
+    def __unicode__(self):
+        return u'Provedor: {0} - {1}'.format(self.provider, self.get_status_display())
+
+    class Meta:
+        verbose_name = u'Adição de conta'
+        verbose_name_plural = u'Adições de conta'
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+
+# per-user cache of the account list pages, only with the columns they render
+ACCOUNT_LIST_FIELDS = (
+    'provider', 'provider_id', 'provider_username', 'expires_in', 'updated_on'
+)
+PROFILE_LIST_FIELDS = ('account', 'name', 'picture', 'followers', 'fetched_on')
+
+
+def account_list_cache_key(user_id):
+    # holds the version of the cached pages of the user
+    return 'accounts:list:{0}'.format(user_id)
+
+
+class AccountList(object):
+    """
+    The accounts of a user, for a Paginator. The count and every page are
+    queried and cached apart, so a page costs one page of rows however many
+    accounts the user has. They are keyed by a per-user version, which
+    invalidate_account_list() drops to orphan them all at once.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._version = None
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'ACCOUNTS_LIST_CACHE_TIMEOUT', 300)
+
+    @property
+    def version(self):
+        if self._version is None:
+            key = account_list_cache_key(self.user.pk)
+            version = cache.get(key)
+            if version is None:
+                version = uuid.uuid4().hex
+                if not cache.add(key, version, self.timeout):
+                    version = cache.get(key) or version
+            self._version = version
+        return self._version
+
+    def _cached(self, name, compute):
+        key = '{0}:{1}:{2}'.format(account_list_cache_key(self.user.pk), self.version, name)
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, self.timeout)
+        return value
+
+    def count(self):
+        return self._cached('count', Account.objects.filter(user=self.user).count)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        return self._cached(
+            '{0}:{1}'.format(start, stop), lambda: self._page(start, stop)
+        )
+
+    def _page(self, start, stop):
+        accounts = list(
+            Account.objects.filter(user=self.user).only(*ACCOUNT_LIST_FIELDS)
+            .order_by('pk')[start:stop]
+        )
+        # the profile snapshots, without the raw provider answer
+        profiles = dict(
+            (profile.account_id, profile) for profile in
+            AccountProfile.objects.filter(account__in=[account.pk for account in accounts])
+            .only(*PROFILE_LIST_FIELDS)
+        ) if accounts else {}
+        for account in accounts:
+            account.snapshot = profiles.get(account.pk)
+        return accounts
+
+
+def get_account_list(user):
+    return AccountList(user)
+
+
+def invalidate_account_list(user_id):
+    cache.delete(account_list_cache_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=Account)
+def account_changed(sender, instance, **kwargs):
+    invalidate_account_list(instance.user_id)
+
+
+# deleting an account already drops the list through account_changed
+@receiver(post_save, sender=AccountProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_account_list(instance.account.user_id)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from accounts import futures
+from accounts.providers import get_provider, provider_url
+
+
+def _fetch(client, url, params):
+    r = client.get(provider_url(url), params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def iter_pages(account, url, params=None, max_pages=None):
+    """
+    Yields the items of each page of a provider listing, following the
+    provider's cursors. The next page is requested as soon as the current
+    one arrives and downloads while the current one is consumed, so at most
+    two pages are held in memory.
+    """
+    provider = get_provider(account.provider)
+    client = account.get_client()
+
+    params = params or {}
+    next_page = provider.parse_page(_fetch(client, url, params), url, params)
+    pages = 0
+    while True:
+        items, next_request = next_page
+        pages += 1
+        prefetch = None
+        if next_request is not None and (max_pages is None or pages < max_pages):
+            prefetch = futures.spawn(_fetch, client, *next_request)
+
+        yield items
+
+        if prefetch is None:
+            return
+        # a consumer that stops early leaves the prefetched page unread
+        next_page = provider.parse_page(prefetch.get(), *next_request)
+
+
+def iter_items(account, url, params=None, max_pages=None):
+    for items in iter_pages(account, url, params, max_pages):
+        for item in items:
+            yield item
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from accounts.fanout import fan_out, profile_endpoints
+from accounts.models import Account, AccountProfile
+from accounts.refresh import RefreshReport, iter_accounts
+
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_profiles(queryset=None, max_age=None, limits=None, chunk_size=500):
+    """
+    Fetches again the profile of the accounts whose snapshot is older than
+    max_age seconds (ACCOUNTS_PROFILE_TTL by default) or missing, with the
+    per provider concurrency of fan_out().
+    """
+    if queryset is None:
+        queryset = Account.objects.stale_profiles(max_age)
+
+    report = RefreshReport(u'profiles')
+    endpoints = profile_endpoints()
+    for chunk in iter_accounts(queryset, chunk_size):
+        for result in fan_out(chunk, endpoints, limits=limits):
+            report.add_latency(result.elapsed)
+            try:
+                if result.error is not None:
+                    raise result.error
+                result.response.raise_for_status()
+                AccountProfile.objects.store(result.account, result.response.json())
+            except Exception:
+                logger.exception(u'Error refreshing the profile of account %s', result.account.pk)
+                report.failed += 1
+            else:
+                report.refreshed += 1
+
+    report.finished = time.time()
+    return report
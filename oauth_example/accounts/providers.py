@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.utils.importlib import import_module
+
+from datetime import datetime, timedelta
+from urllib import quote_plus, urlencode
+from urlparse import parse_qs
+import threading
+
+from accounts.tokenstore import store_request_token, pop_request_token
+
+
+def load_class(path):
+    # rauth and requests are imported on first use, not with the models
+    module, name = path.rsplit('.', 1)
+    return getattr(import_module(module), name)
+
+
+class Provider(object):
+    name = None
+    label = None
+    refreshable = False
+
+    # rauth service and session, as dotted paths loaded by build_service()
+    service_class = None
+    session_class = None
+    endpoints = {}
+
+    # settings holding the credentials and the callback url
+    key_setting = None
+    secret_setting = None
+    callback_url_setting = None
+
+    profile_url = None
+
+    # batch calls, see accounts.batch
+    batch_format = None
+    batch_url = None
+    batch_limit = 1
+
+    # default budget of an account per endpoint, (calls, seconds), see
+    # accounts.ratelimit
+    rate_limit = (60, 60)
+
+    # call that invalidates the tokens of an account on the provider, see
+    # accounts.refresh.revoke_tokens
+    revoke_method = None
+    revoke_url = None
+
+    # filled by prepare() when the service is built
+    authorize_url_template = None
+    profile_endpoint = None
+
+    def __init__(self):
+        self._service = None
+        self._lock = threading.Lock()
+
+    @property
+    def new_url_name(self):
+        return 'accounts_{0}_new'.format(self.name)
+
+    @property
+    def callback_url_name(self):
+        return 'accounts_{0}_callback'.format(self.name)
+
+    @property
+    def callback_url(self):
+        return getattr(settings, self.callback_url_setting)
+
+    @property
+    def error_message(self):
+        return u'Ocorreu um erro ao adicionar a conta do {0}.'.format(self.name)
+
+    @property
+    def success_message(self):
+        return u'Conta do {0} adicionada com sucesso.'.format(self.name)
+
+    @property
+    def pending_message(self):
+        return u'A conta do {0} está sendo adicionada.'.format(self.name)
+
+    @property
+    def unavailable_message(self):
+        return u'O {0} está indisponível no momento, tente novamente mais tarde.'.format(self.name)
+
+    @property
+    def breaker(self):
+        from accounts.resilience import get_breaker
+        return get_breaker(self.name)
+
+    # the service is built once per process and shared by threads
+    @property
+    def service(self):
+        service = self._service
+        if service is None:
+            with self._lock:
+                service = self._service
+                if service is None:
+                    service = self.build_service()
+                    self.prepare(service)
+                    self._service = service
+        return service
+
+    def build_service(self):
+        raise NotImplementedError
+
+    def get_endpoints(self):
+        return dict(
+            (name, provider_url(url)) for name, url in self.endpoints.items()
+        )
+
+    def prepare(self, service):
+        # precompute what does not change between requests
+        self.profile_endpoint = provider_url(self.profile_url)
+
+    def reset(self):
+        with self._lock:
+            self._service = None
+
+    def get_authorize_url(self, request):
+        raise NotImplementedError
+
+    def get_callback_params(self, request):
+        raise NotImplementedError
+
+    def fetch_tokens(self, params):
+        raise NotImplementedError
+
+    def get_session(self, account):
+        raise NotImplementedError
+
+    def fetch_profile(self, tokens):
+        client = self.get_session(tokens)
+        return client.get(self.profile_endpoint).json()
+
+    def map_profile(self, data):
+        raise NotImplementedError
+
+    def get_revoke_url(self, account):
+        return self.revoke_url
+
+    def map_snapshot(self, data):
+        # what the pages show of a profile, see AccountProfile
+        return {
+            'name': data.get('name') or u'',
+            'picture': data.get('picture') or u'',
+            'followers': None,
+        }
+
+    def complete(self, params):
+        tokens = self.fetch_tokens(params)
+        data = self.fetch_profile(tokens)
+        profile = self.map_profile(data)
+        # the whole answer goes to the profile snapshot
+        profile['data'] = data
+        return tokens, profile
+
+    def parse_page(self, data, url, params):
+        # items of a listing response and the (url, params) of the next
+        # page, or None on the last one
+        raise NotImplementedError
+
+
+class OAuth1Provider(Provider):
+    service_class = 'rauth.OAuth1Service'
+    session_class = 'accounts.sessions.PooledOAuth1Session'
+
+    def build_service(self):
+        return load_class(self.service_class)(
+            consumer_key=getattr(settings, self.key_setting),
+            consumer_secret=getattr(settings, self.secret_setting),
+            name=self.name,
+            session_obj=load_class(self.session_class),
+            **self.get_endpoints()
+        )
+
+    def prepare(self, service):
+        super(OAuth1Provider, self).prepare(service)
+        self.authorize_url_template = service.authorize_url + '?oauth_token={0}'
+
+    def get_authorize_url(self, request):
+        request_token, request_token_secret = self.service.get_request_token()
+
+        # the callback finds the secret by the request token
+        store_request_token(self.name, request.user, request_token, request_token_secret)
+
+        return self.authorize_url_template.format(quote_plus(request_token))
+
+    def get_callback_params(self, request):
+        oauth_token = request.GET.get('oauth_token', None)
+        oauth_verifier = request.GET.get('oauth_verifier', None)
+        if not oauth_token or not oauth_verifier:
+            return None
+        oauth_token_secret = pop_request_token(self.name, request.user, oauth_token)
+        if not oauth_token_secret:
+            return None
+        return {
+            'oauth_token': oauth_token,
+            'oauth_token_secret': oauth_token_secret,
+            'oauth_verifier': oauth_verifier,
+        }
+
+    def fetch_tokens(self, params):
+        oauth_token, oauth_token_secret = self.service.get_access_token(
+            params['oauth_token'],
+            params['oauth_token_secret'],
+            data={'oauth_verifier': params['oauth_verifier']}
+        )
+        return {
+            'oauth_token': oauth_token,
+            'oauth_token_secret': oauth_token_secret,
+        }
+
+    def get_session(self, account):
+        return self.service.get_session(
+            token=(_get(account, 'oauth_token'), _get(account, 'oauth_token_secret'))
+        )
+
+
+class OAuth2Provider(Provider):
+    service_class = 'rauth.OAuth2Service'
+    session_class = 'accounts.sessions.PooledOAuth2Session'
+    scopes = ()
+    authorize_params = {}
+    token_params = {}
+
+    def build_service(self):
+        return load_class(self.service_class)(
+            client_id=getattr(settings, self.key_setting),
+            client_secret=getattr(settings, self.secret_setting),
+            name=self.name,
+            session_obj=load_class(self.session_class),
+            **self.get_endpoints()
+        )
+
+    def prepare(self, service):
+        super(OAuth2Provider, self).prepare(service)
+
+        # the authorize url has no per-request parts
+        params = {}
+        if self.scopes:
+            params['scope'] = u' '.join(self.scopes)
+        params.update(self.authorize_params)
+        params['redirect_uri'] = self.callback_url
+        self.authorize_url_template = service.get_authorize_url(**params)
+
+    def get_authorize_url(self, request):
+        # prepare() builds it together with the service, which is created on
+        # first access
+        self.service
+        return self.authorize_url_template
+
+    def get_callback_params(self, request):
+        code = request.GET.get('code', None)
+        if not code:
+            return None
+        return {'code': code}
+
+    def fetch_tokens(self, params):
+        data = dict(
+            self.token_params,
+            code=params['code'],
+            redirect_uri=self.callback_url
+        )
+        r = self.service.get_raw_access_token(data=data)
+        return self.parse_token(r)
+
+    def parse_token(self, response):
+        data = response.json()
+        tokens = {'oauth_token': data['access_token']}
+        if data.get('expires_in'):
+            tokens['expires_in'] = _expires_in(data['expires_in'])
+        if data.get('refresh_token'):
+            tokens['refresh_token'] = data['refresh_token']
+        return tokens
+
+    def refresh_access_token(self, refresh_token):
+        payload = {
+            'client_id': getattr(settings, self.key_setting),
+            'client_secret': getattr(settings, self.secret_setting),
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token'
+        }
+        from accounts.sessions import PooledSession
+        # the same grant can be sent again, so it is retried like a GET
+        r = PooledSession(self.name).post(
+            self.service.access_token_url, data=payload, idempotent=True
+        )
+        data = r.json()
+        return data['access_token'], _expires_in(data['expires_in'])
+
+    def get_session(self, account):
+        return self.service.get_session(token=_get(account, 'oauth_token'))
+
+
+def provider_url(url):
+    # ACCOUNTS_PROVIDER_HOSTS points provider origins elsewhere, e.g. at
+    # the local fake provider from ./manage.py run_fake_provider
+    for origin, base in getattr(settings, 'ACCOUNTS_PROVIDER_HOSTS', {}).items():
+        if url.startswith(origin):
+            return base.rstrip('/') + url[len(origin):]
+    return url
+
+
+def _get(account, name):
+    # sessions are built from an Account or from freshly fetched tokens
+    if isinstance(account, dict):
+        return account.get(name)
+    return getattr(account, name)
+
+
+def _expires_in(seconds):
+    return datetime.now() + timedelta(seconds=int(seconds))
+
+
+class TwitterProvider(OAuth1Provider):
+    name = 'twitter'
+    label = u'Twitter'
+    endpoints = {
+        'access_token_url': 'https://api.twitter.com/oauth/access_token',
+        'authorize_url': 'https://api.twitter.com/oauth/authorize',
+        'request_token_url': 'https://api.twitter.com/oauth/request_token',
+        'base_url': 'https://api.twitter.com/1.1/',
+    }
+    key_setting = 'TWITTER_KEY'
+    secret_setting = 'TWITTER_SECRET'
+    callback_url_setting = 'TWITTER_CALLBACK_URL'
+    profile_url = 'account/verify_credentials.json'
+    rate_limit = (15, 900)
+
+    def map_profile(self, data):
+        return {
+            'provider_id': unicode(data['id']),
+            'provider_username': unicode(data['screen_name']),
+        }
+
+    def map_snapshot(self, data):
+        return {
+            'name': data.get('name') or u'',
+            'picture': data.get('profile_image_url_https') or u'',
+            'followers': data.get('followers_count'),
+        }
+
+    def parse_page(self, data, url, params):
+        # timelines are lists walked back with max_id
+        if isinstance(data, list):
+            if not data:
+                return data, None
+            return data, (url, dict(params, max_id=data[-1]['id'] - 1))
+
+        # everything else is a cursored object, e.g. {'ids': [...], 'next_cursor': ...}
+        items = []
+        for key in ('ids', 'users', 'lists'):
+            if key in data:
+                items = data[key]
+                break
+        cursor = data.get('next_cursor_str', '0')
+        if not items or cursor == '0':
+            return items, None
+        return items, (url, dict(params, cursor=cursor))
+
+
+class FacebookProvider(OAuth2Provider):
+    name = 'facebook'
+    label = u'Facebook'
+    endpoints = {
+        'authorize_url': 'https://www.facebook.com/dialog/oauth',
+        'access_token_url': 'https://graph.facebook.com/oauth/access_token',
+        'base_url': 'https://graph.facebook.com/',
+    }
+    key_setting = 'FACEBOOK_APP_ID'
+    secret_setting = 'FACEBOOK_APP_SECRET'
+    callback_url_setting = 'FACEBOOK_CALLBACK_URL'
+    profile_url = 'me'
+    batch_format = 'graph'
+    batch_url = 'https://graph.facebook.com/'
+    batch_limit = 50
+    rate_limit = (200, 3600)
+    revoke_method = 'DELETE'
+    revoke_url = 'me/permissions'
+
+    def parse_token(self, response):
+        # facebook answers with a query string
+        credentials = parse_qs(response.content)
+        return {
+            'oauth_token': credentials.get('access_token')[0],
+            'expires_in': _expires_in(credentials.get('expires')[0]),
+        }
+
+    def map_profile(self, data):
+        return {
+            'provider_id': unicode(data['id']),
+            'provider_username': unicode(data['username']),
+        }
+
+    def map_snapshot(self, data):
+        return {
+            'name': data.get('name') or u'',
+            'picture': u'https://graph.facebook.com/{0}/picture'.format(data['id']),
+            'followers': None,
+        }
+
+    def parse_page(self, data, url, params):
+        # paging.next is the full url of the next page
+        next_url = data.get('paging', {}).get('next')
+        if not data.get('data') or not next_url:
+            return data.get('data', []), None
+        return data['data'], (next_url, {})
+
+
+class YoutubeProvider(OAuth2Provider):
+    name = 'youtube'
+    label = u'Youtube'
+    refreshable = True
+    endpoints = {
+        'authorize_url': 'https://accounts.google.com/o/oauth2/auth',
+        'access_token_url': 'https://accounts.google.com/o/oauth2/token',
+        'base_url': 'https://www.googleapis.com/youtube/v3/',
+    }
+    key_setting = 'YOUTUBE_CLIENT_ID'
+    secret_setting = 'YOUTUBE_CLIENT_SECRET'
+    callback_url_setting = 'YOUTUBE_CALLBACK_URL'
+    scopes = (
+        'https://www.googleapis.com/auth/youtube',
+        'https://www.googleapis.com/auth/userinfo.profile',
+        'https://www.googleapis.com/auth/userinfo.email',
+    )
+    authorize_params = {
+        'access_type': 'offline',
+        'approval_prompt': 'force',
+        'response_type': 'code',
+    }
+    token_params = {'grant_type': 'authorization_code'}
+    profile_url = 'https://www.googleapis.com/oauth2/v1/userinfo'
+    batch_format = 'multipart'
+    batch_url = 'https://www.googleapis.com/batch/youtube/v3'
+    batch_limit = 1000
+    rate_limit = (100, 100)
+    revoke_method = 'POST'
+    revoke_url = 'https://accounts.google.com/o/oauth2/revoke'
+
+    def map_profile(self, data):
+        return {
+            'provider_id': unicode(data['id']),
+            'provider_username': unicode(data['email']),
+        }
+
+    def get_revoke_url(self, account):
+        # revoking the refresh token revokes the whole grant
+        return '{0}?{1}'.format(self.revoke_url, urlencode({
+            'token': account.refresh_token or account.oauth_token
+        }))
+
+    def parse_page(self, data, url, params):
+        token = data.get('nextPageToken')
+        if not token:
+            return data.get('items', []), None
+        return data['items'], (url, dict(params, pageToken=token))
+
+
+# registry, in the order providers are offered to the user
+PROVIDER_LIST = (
+    TwitterProvider(),
+    FacebookProvider(),
+    YoutubeProvider(),
+)
+
+PROVIDERS = dict((provider.name, provider) for provider in PROVIDER_LIST)
+
+
+def get_provider(name):
+    return PROVIDERS[name]
+
+
+def reset_providers():
+    for provider in PROVIDER_LIST:
+        provider.reset()
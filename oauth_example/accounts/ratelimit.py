@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.cache import cache
+
+from urlparse import urljoin, urlparse
+import json
+import time
+
+import requests
+
+from accounts.providers import get_provider, provider_url
+
+
+# facebook error codes of throttled apps, users and pages
+FACEBOOK_THROTTLE_CODES = frozenset([4, 17, 32, 613])
+
+# google reasons of quota and rate errors
+GOOGLE_THROTTLE_REASONS = frozenset([
+    'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded', 'dailyLimitExceeded'
+])
+
+
+class RateLimited(requests.RequestException):
+    # raised instead of a call the provider would reject
+
+    def __init__(self, account, endpoint, retry_after):
+        super(RateLimited, self).__init__(
+            u'{0} account {1} is rate limited on {2} for {3:.0f}s'.format(
+                account.provider, account.pk, endpoint, retry_after
+            )
+        )
+        self.retry_after = retry_after
+
+
+def endpoint_key(provider, url):
+    # the path on the real provider host, relative and absolute urls of the
+    # same endpoint share a bucket
+    return urlparse(urljoin(provider.endpoints['base_url'], url)).path
+
+
+class TokenBucket(object):
+    """
+    Budget of one account on one endpoint. It refills continuously at the
+    provider's rate_limit and follows what the provider reports: Twitter's
+    x-rate-limit headers, Facebook's X-App-Usage and the throttling errors
+    of every provider.
+
+    The state lives in the cache so every process shares it. Updates are not
+    atomic, concurrent processes may let a few extra calls through, and the
+    provider answers bring the bucket back in line.
+    """
+
+    def __init__(self, account, endpoint):
+        self.account = account
+        self.provider = get_provider(account.provider)
+        self.endpoint = endpoint
+        self.key = 'accounts:ratelimit:{0}:{1}'.format(account.pk, endpoint)
+
+    def load(self):
+        calls, period = self.provider.rate_limit
+        state = cache.get(self.key) or {
+            'capacity': calls, 'tokens': float(calls), 'updated': time.time(),
+            'blocked_until': 0, 'reset': 0,
+        }
+        now = time.time()
+        if state['reset'] and now >= state['reset']:
+            # the provider window is over, the budget is whole again
+            state['tokens'] = float(state['capacity'])
+            state['reset'] = 0
+        elif not state['reset']:
+            # refill since the last update, unless the provider told us
+            # when its window ends
+            rate = float(state['capacity']) / period
+            state['tokens'] = min(state['capacity'], state['tokens'] + (now - state['updated']) * rate)
+        state['updated'] = now
+        return state
+
+    def save(self, state):
+        cache.set(self.key, state, self.provider.rate_limit[1] * 2)
+
+    def remaining(self):
+        # calls available now and seconds until the next one
+        state = self.load()
+        return int(state['tokens']), self._wait(state)
+
+    def _wait(self, state):
+        blocked = max(state['blocked_until'] - time.time(), 0)
+        if state['tokens'] >= 1:
+            return blocked
+        rate = float(state['capacity']) / self.provider.rate_limit[1]
+        return max(blocked, (1 - state['tokens']) / rate)
+
+    def acquire(self, max_wait=0):
+        # takes a token, sleeping up to max_wait seconds for one
+        while True:
+            state = self.load()
+            wait = self._wait(state)
+            if not wait:
+                state['tokens'] -= 1
+                self.save(state)
+                return
+            if wait > max_wait:
+                raise RateLimited(self.account, self.endpoint, wait)
+            time.sleep(wait)
+            max_wait -= wait
+
+    def update(self, response):
+        state = self.load()
+        headers = response.headers
+
+        # twitter: exact numbers for the current window
+        if 'x-rate-limit-remaining' in headers:
+            remaining = int(headers['x-rate-limit-remaining'])
+            state['tokens'] = float(remaining)
+            if 'x-rate-limit-limit' in headers:
+                state['capacity'] = int(headers['x-rate-limit-limit'])
+            if 'x-rate-limit-reset' in headers:
+                state['reset'] = float(headers['x-rate-limit-reset'])
+                if not remaining:
+                    state['blocked_until'] = state['reset']
+
+        # facebook: percentage of the app budget already used
+        usage = headers.get('x-app-usage') or headers.get('x-business-use-case-usage')
+        if usage:
+            try:
+                used = max(_usage_values(json.loads(usage)) or [0])
+            except (ValueError, TypeError):
+                used = 0
+            state['tokens'] = min(state['tokens'], state['capacity'] * max(100 - used, 0) / 100.0)
+
+        if _throttled(response):
+            retry_after = headers.get('retry-after')
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = getattr(settings, 'ACCOUNTS_RATELIMIT_COOLDOWN', 60)
+            state['tokens'] = 0.0
+            state['blocked_until'] = max(state['blocked_until'], time.time() + retry_after)
+
+        self.save(state)
+
+
+def _usage_values(usage):
+    # X-Business-Use-Case-Usage nests the X-App-Usage numbers per business
+    if isinstance(usage, dict):
+        if 'call_count' in usage:
+            return [usage[k] for k in ('call_count', 'total_time', 'total_cputime') if k in usage]
+        usage = [entry for entries in usage.values() for entry in entries]
+    return [value for entry in usage for value in _usage_values(entry)]
+
+
+def _throttled(response):
+    if response.status_code == 429:
+        return True
+    if response.status_code not in (400, 403):
+        return False
+    try:
+        error = response.json().get('error')
+    except ValueError:
+        return False
+    if not isinstance(error, dict):
+        return False
+    if error.get('code') in FACEBOOK_THROTTLE_CODES:
+        return True
+    reasons = set(e.get('reason') for e in error.get('errors', []))
+    return bool(reasons & GOOGLE_THROTTLE_REASONS)
+
+
+class RateLimitedClient(object):
+    # wraps the session of Account.get_client(), calls wait for the budget
+    # of their endpoint and update it from the answer
+
+    def __init__(self, account, max_wait=None):
+        self.account = account
+        self.provider = get_provider(account.provider)
+        self.client = account.get_client()
+        if max_wait is None:
+            max_wait = getattr(settings, 'ACCOUNTS_RATELIMIT_MAX_WAIT', 30)
+        self.max_wait = max_wait
+
+    def bucket(self, url):
+        return TokenBucket(self.account, endpoint_key(self.provider, url))
+
+    def remaining(self, url):
+        return self.bucket(url).remaining()
+
+    def request(self, method, url, **kwargs):
+        # answers served from memory do not reach the provider, they cost
+        # nothing and say nothing about the budget
+        cached = getattr(self.client, 'cached', None)
+        r = cached(method, provider_url(url), **kwargs) if cached else None
+        if r is not None:
+            return r
+
+        bucket = self.bucket(url)
+        bucket.acquire(self.max_wait)
+        r = self.client.request(method, provider_url(url), **kwargs)
+        bucket.update(r)
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+def remaining_budgets(accounts, url):
+    # account -> (calls left now, seconds until the next one), for picking
+    # which accounts a scheduler should work on
+    return dict(
+        (account, TokenBucket(
+            account, endpoint_key(get_provider(account.provider), url)
+        ).remaining())
+        for account in accounts
+    )
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.db import connection, transaction
+
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+import logging
+import random
+import threading
+import time
+
+from accounts.fanout import fan_out
+from accounts.models import Account, invalidate_account_list
+from accounts.providers import PROVIDER_LIST, get_provider
+
+
+logger = logging.getLogger(__name__)
+
+# latencies a report keeps for its percentiles, past this many calls they
+# are a uniform sample of all of them, so memory stays flat on long runs
+LATENCY_SAMPLE_SIZE = 10000
+
+
+class RefreshReport(object):
+    # noun names what was refreshed, in the summary
+
+    def __init__(self, noun=u'tokens'):
+        self.noun = noun
+        self.refreshed = 0
+        self.failed = 0
+        self.latencies = []
+        self.timed = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def total(self):
+        return self.refreshed + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        if not self.elapsed:
+            return 0.0
+        return self.total / self.elapsed
+
+    def add_latency(self, latency):
+        # reservoir sampling
+        self.timed += 1
+        if len(self.latencies) < LATENCY_SAMPLE_SIZE:
+            self.latencies.append(latency)
+            return
+        index = random.randrange(self.timed)
+        if index < LATENCY_SAMPLE_SIZE:
+            self.latencies[index] = latency
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        index = int(round(p / 100.0 * (len(latencies) - 1)))
+        return latencies[index]
+
+    def __unicode__(self):
+        return (
+            u'{0} {1} refreshed, {2} failures in {3:.1f}s '
+            u'({4:.1f}/s, p50 {5:.0f}ms, p90 {6:.0f}ms, p99 {7:.0f}ms)'
+        ).format(
+            self.refreshed, self.noun, self.failed, self.elapsed, self.throughput,
+            self.percentile(50) * 1000, self.percentile(90) * 1000,
+            self.percentile(99) * 1000
+        )
+
+
+def _refresh(row):
+    pk, provider, refresh_token = row[:3]
+    started = time.time()
+    try:
+        access_token, expires_in = \
+            get_provider(provider).refresh_access_token(refresh_token)
+    except Exception:
+        logger.exception(u'Error refreshing account %s', pk)
+        return row, None, time.time() - started
+    return row, (access_token, expires_in), time.time() - started
+
+
+def iter_chunks(queryset, chunk_size):
+    # keyset pagination, so memory stays constant on large tables
+    queryset = queryset.order_by('pk').values_list(
+        'pk', 'provider', 'refresh_token', 'expires_in', 'user'
+    )
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def iter_accounts(queryset, chunk_size):
+    # same as iter_chunks, with whole accounts
+    queryset = queryset.order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def _write_tokens(rows, now):
+    # rows of (pk, old expires_in, access token, new expires_in), written with
+    # one executemany() instead of an UPDATE per account. The expires_in guard
+    # skips the rows refreshed meanwhile by get_client()
+    opts = Account._meta
+    qn = connection.ops.quote_name
+    field = opts.get_field
+    sql = 'UPDATE {0} SET {1} = %s, {2} = %s, {3} = %s WHERE {4} = %s AND {2} {{0}}'.format(
+        qn(opts.db_table), qn(field('oauth_token').column), qn(field('expires_in').column),
+        qn(field('updated_on').column), qn(opts.pk.column)
+    )
+    guarded, unguarded = [], []
+    for pk, old_expires_in, access_token, expires_in in rows:
+        params = [
+            access_token,
+            field('expires_in').get_db_prep_save(expires_in, connection=connection),
+            field('updated_on').get_db_prep_save(now, connection=connection),
+            pk,
+        ]
+        if old_expires_in is None:
+            unguarded.append(params)
+        else:
+            params.append(field('expires_in').get_db_prep_save(old_expires_in, connection=connection))
+            guarded.append(params)
+
+    cursor = connection.cursor()
+    if guarded:
+        cursor.executemany(sql.format('= %s'), guarded)
+    if unguarded:
+        cursor.executemany(sql.format('IS NULL'), unguarded)
+
+
+def bulk_refresh(queryset=None, workers=8, chunk_size=500):
+    if queryset is None:
+        queryset = Account.objects.expiring()
+
+    report = RefreshReport()
+    pool = ThreadPool(workers)
+    try:
+        for chunk in iter_chunks(queryset, chunk_size):
+            results = pool.map(_refresh, chunk)
+
+            rows = []
+            user_ids = set()
+            for row, tokens, latency in results:
+                report.add_latency(latency)
+                if tokens is None:
+                    report.failed += 1
+                    continue
+                pk, provider, refresh_token, old_expires_in, user_id = row
+                rows.append((pk, old_expires_in) + tuple(tokens))
+                user_ids.add(user_id)
+                report.refreshed += 1
+
+            # write back the chunk in a single transaction
+            with transaction.commit_on_success():
+                _write_tokens(rows, datetime.now())
+            # raw statements do not send post_save
+            for user_id in user_ids:
+                invalidate_account_list(user_id)
+    finally:
+        pool.close()
+        pool.join()
+
+    report.finished = time.time()
+    return report
+
+
+def revoke_tokens(queryset, chunk_size=500, limits=None):
+    """
+    Revokes the tokens of the accounts on their provider, with the per
+    provider concurrency of fan_out(), and clears them. Tokens are cleared
+    even when the provider call fails, the report counts those as failures.
+    """
+    report = RefreshReport()
+    methods = {}
+    for provider in PROVIDER_LIST:
+        if provider.revoke_method:
+            methods.setdefault(provider.revoke_method, {})[provider.name] = provider.get_revoke_url
+
+    for chunk in iter_accounts(queryset.exclude(oauth_token=''), chunk_size):
+        failed = 0
+        for method, endpoints in methods.items():
+            for result in fan_out(chunk, endpoints, method=method, limits=limits):
+                report.add_latency(result.elapsed)
+                if result.error is not None or result.response.status_code >= 400:
+                    logger.error(
+                        u'Error revoking the tokens of account %s: %s',
+                        result.account.pk, result.error or result.response.status_code
+                    )
+                    failed += 1
+
+        Account.objects.filter(pk__in=[account.pk for account in chunk]).update(
+            oauth_token='', oauth_token_secret='', refresh_token='',
+            expires_in=None, updated_on=datetime.now()
+        )
+        # queryset updates do not send post_save
+        for user_id in set(account.user_id for account in chunk):
+            invalidate_account_list(user_id)
+        report.refreshed += len(chunk) - failed
+        report.failed += failed
+
+    report.finished = time.time()
+    return report
+
+
+# stale-while-revalidate refreshes, at most one in flight per account
+_background = {'pool': None, 'pending': set()}
+_background_lock = threading.Lock()
+
+
+def _background_refresh(pk):
+    try:
+        Account.objects.get(pk=pk).google_refresh_token()
+    except Exception:
+        logger.exception(u'Error refreshing account %s', pk)
+    finally:
+        with _background_lock:
+            _background['pending'].discard(pk)
+        # the worker thread owns its own connection
+        connection.close()
+
+
+def refresh_in_background(account):
+    with _background_lock:
+        if account.pk in _background['pending']:
+            return False
+        _background['pending'].add(account.pk)
+        if _background['pool'] is None:
+            _background['pool'] = ThreadPool(
+                getattr(settings, 'ACCOUNTS_BACKGROUND_REFRESH_WORKERS', 2)
+            )
+        pool = _background['pool']
+    pool.apply_async(_background_refresh, (account.pk,))
+    return True
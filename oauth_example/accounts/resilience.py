@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+
+import random
+import threading
+import time
+
+import requests
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# methods that can be sent again without side effects
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# answers worth retrying, the provider may be fine a moment later
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+
+class ProviderUnavailable(requests.RequestException):
+    # raised without calling the provider while its breaker is open
+
+    def __init__(self, provider):
+        super(ProviderUnavailable, self).__init__(
+            u'{0} is unavailable, circuit breaker open'.format(provider)
+        )
+        self.provider = provider
+
+
+class CircuitBreaker(object):
+    # opens after ACCOUNTS_BREAKER_FAILURES consecutive failures and lets a
+    # single trial call through ACCOUNTS_BREAKER_RESET_TIMEOUT seconds later,
+    # the trial closes it again or keeps it open for another period
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.opened_at = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def failure_threshold(self):
+        return getattr(settings, 'ACCOUNTS_BREAKER_FAILURES', 5)
+
+    @property
+    def reset_timeout(self):
+        return getattr(settings, 'ACCOUNTS_BREAKER_RESET_TIMEOUT', 30)
+
+    def available(self):
+        # whether a call would be let through, without claiming the trial
+        with self._lock:
+            if self.state == OPEN:
+                return time.time() - self.opened_at >= self.reset_timeout
+            return not (self.state == HALF_OPEN and self._trial)
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial):
+                raise ProviderUnavailable(self.name)
+            if self.state == HALF_OPEN:
+                self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+                self._trial = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'opened': self.opened,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened = 0
+            self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return dict((breaker.name, breaker.snapshot()) for breaker in breakers)
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_timeout(provider, path):
+    # (connect, read) seconds, ACCOUNTS_HTTP_TIMEOUTS overrides the default
+    # per provider and endpoint path, e.g. {'youtube': {'/o/oauth2/token': (3.05, 5)}}
+    timeouts = getattr(settings, 'ACCOUNTS_HTTP_TIMEOUTS', {}).get(provider, {})
+    for suffix, timeout in timeouts.items():
+        if path.endswith(suffix):
+            return timeout
+    return getattr(settings, 'ACCOUNTS_HTTP_TIMEOUT', (3.05, 10))
+
+
+def backoff(attempt):
+    # full jitter, spreads the retries of many workers over the window
+    base = getattr(settings, 'ACCOUNTS_HTTP_RETRY_BACKOFF', 0.1)
+    return random.uniform(0, min(base * 2 ** attempt, 2.0))
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from accounts.providers import get_provider, reset_providers
+
+
+# rauth services are built once per process by their provider
+def get_service(name):
+    return get_provider(name).service
+
+
+def reset_services():
+    reset_providers()
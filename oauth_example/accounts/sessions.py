@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+from urlparse import urljoin, urlparse
+import threading
+import time
+
+from django.conf import settings
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.packages.urllib3.connectionpool import (
+    HTTPConnectionPool, HTTPSConnectionPool
+)
+from rauth import OAuth1Session, OAuth2Session
+
+from accounts import instrumentation, resilience
+from accounts.httpcache import CachingMixin
+
+
+# pool counters, a miss is a request that had to open a new connection
+_stats = {'requests': 0, 'misses': 0, 'recycled': 0}
+_stats_lock = threading.Lock()
+
+
+def _incr(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['hits'] = max(stats['requests'] - stats['misses'], 0)
+    return stats
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+
+    def _new_conn(self):
+        _incr('misses')
+        return super(CountingHTTPConnectionPool, self)._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+
+    def _new_conn(self):
+        _incr('misses')
+        return super(CountingHTTPSConnectionPool, self)._new_conn()
+
+
+# adapter mounted on every provider session, it delegates to one
+# process-wide HTTPAdapter so sessions built per account reuse the same
+# keep-alive connections. The pool is rebuilt once it is older than
+# ACCOUNTS_HTTP_CONNECTION_LIFETIME seconds.
+class SharedPoolAdapter(BaseAdapter):
+
+    def __init__(self):
+        super(SharedPoolAdapter, self).__init__()
+        self._adapter = None
+        self._created = 0
+        # sends running per adapter, a recycled one is closed after its last
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _build_adapter(self):
+        adapter = HTTPAdapter(
+            pool_connections=getattr(settings, 'ACCOUNTS_HTTP_POOL_CONNECTIONS', 10),
+            pool_maxsize=getattr(settings, 'ACCOUNTS_HTTP_POOL_MAXSIZE', 10)
+        )
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+        return adapter
+
+    def _retire(self, adapter):
+        # called with the lock held
+        if not self._in_flight.get(adapter):
+            self._in_flight.pop(adapter, None)
+            adapter.close()
+
+    def get_adapter(self):
+        # the adapter is held until release() is called with it
+        lifetime = getattr(settings, 'ACCOUNTS_HTTP_CONNECTION_LIFETIME', 300)
+        with self._lock:
+            now = time.time()
+            if self._adapter is None or now - self._created > lifetime:
+                old, self._adapter = self._adapter, self._build_adapter()
+                self._created = now
+                if old is not None:
+                    _incr('recycled')
+                    self._retire(old)
+            adapter = self._adapter
+            self._in_flight[adapter] = self._in_flight.get(adapter, 0) + 1
+            return adapter
+
+    def release(self, adapter):
+        with self._lock:
+            self._in_flight[adapter] -= 1
+            if adapter is not self._adapter:
+                self._retire(adapter)
+
+    def send(self, request, **kwargs):
+        _incr('requests')
+        adapter = self.get_adapter()
+        try:
+            return adapter.send(request, **kwargs)
+        finally:
+            # connections of streamed responses still out go back to a
+            # closed pool, which closes them
+            self.release(adapter)
+
+    def close(self):
+        # sessions are short-lived, closing one must not close the shared pool
+        pass
+
+    def reset(self):
+        with self._lock:
+            old, self._adapter = self._adapter, None
+            if old is not None:
+                self._retire(old)
+
+
+shared_adapter = SharedPoolAdapter()
+
+
+def reset_pool():
+    shared_adapter.reset()
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def mount_shared_pool(session):
+    session.mount('https://', shared_adapter)
+    session.mount('http://', shared_adapter)
+    return session
+
+
+class InstrumentedMixin(object):
+    # records latency, status and size of every call when enabled
+
+    def get_provider_name(self):
+        service = getattr(self, 'service', None)
+        return getattr(service, 'name', None)
+
+    def get_endpoint(self, url):
+        # the path a call goes to, relative urls are resolved against the
+        # service base_url the way rauth does
+        service = getattr(self, 'service', None)
+        base_url = getattr(service, 'base_url', None)
+        if base_url and '://' not in url:
+            url = urljoin(base_url, url)
+        return urlparse(url).path
+
+    def request(self, method, url, **kwargs):
+        if not instrumentation.is_enabled():
+            return super(InstrumentedMixin, self).request(method, url, **kwargs)
+
+        endpoint = self.get_endpoint(url)
+        started = time.time()
+        try:
+            r = super(InstrumentedMixin, self).request(method, url, **kwargs)
+        except Exception:
+            instrumentation.record(self.get_provider_name(), endpoint, time.time() - started)
+            raise
+
+        size = r.headers.get('content-length')
+        if size is None and not kwargs.get('stream'):
+            size = len(r.content)
+        instrumentation.record(
+            self.get_provider_name(), endpoint,
+            time.time() - started, r.status_code, int(size or 0)
+        )
+        return r
+
+
+class ResilientMixin(object):
+    # timeouts, retries of idempotent calls and the provider circuit breaker,
+    # placed before InstrumentedMixin so every attempt gets recorded
+
+    def request(self, method, url, **kwargs):
+        # POSTs that are safe to repeat, like a refresh grant, pass idempotent=True
+        idempotent = kwargs.pop('idempotent', method.upper() in resilience.IDEMPOTENT_METHODS)
+        name = self.get_provider_name()
+        kwargs.setdefault('timeout', resilience.get_timeout(name, self.get_endpoint(url)))
+        if name is None:
+            return super(ResilientMixin, self).request(method, url, **kwargs)
+
+        breaker = resilience.get_breaker(name)
+        breaker.before_call()
+        retries = getattr(settings, 'ACCOUNTS_HTTP_RETRIES', 2) if idempotent else 0
+        attempt = 0
+        while True:
+            try:
+                r = super(ResilientMixin, self).request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    breaker.failure()
+                    raise
+            except Exception:
+                # anything else must not leave a half-open trial claimed
+                breaker.failure()
+                raise
+            else:
+                if r.status_code not in resilience.RETRY_STATUSES or attempt >= retries:
+                    if r.status_code >= 500:
+                        breaker.failure()
+                    else:
+                        breaker.success()
+                    return r
+                r.close()
+            time.sleep(resilience.backoff(attempt))
+            attempt += 1
+
+
+class PooledSession(ResilientMixin, InstrumentedMixin, requests.Session):
+
+    def __init__(self, provider=None):
+        super(PooledSession, self).__init__()
+        self.provider = provider
+        mount_shared_pool(self)
+
+    def get_provider_name(self):
+        return self.provider
+
+
+class PooledOAuth1Session(CachingMixin, ResilientMixin, InstrumentedMixin, OAuth1Session):
+
+    def __init__(self, *args, **kwargs):
+        super(PooledOAuth1Session, self).__init__(*args, **kwargs)
+        mount_shared_pool(self)
+
+
+class PooledOAuth2Session(CachingMixin, ResilientMixin, InstrumentedMixin, OAuth2Session):
+
+    def __init__(self, *args, **kwargs):
+        super(PooledOAuth2Session, self).__init__(*args, **kwargs)
+        mount_shared_pool(self)
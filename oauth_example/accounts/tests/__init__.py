@@ -1 +1,18 @@
-from .test_views import *
\ No newline at end of file
+from .test_views import *
+from .test_services import *
+from .test_sessions import *
+from .test_models import *
+from .test_commands import *
+from .test_refresh import *
+from .test_fakeprovider import *
+from .test_benchmarks import *
+from .test_jobs import *
+from .test_fanout import *
+from .test_pagination import *
+from .test_batch import *
+from .test_ratelimit import *
+from .test_httpcache import *
+from .test_profiles import *
+from .test_transfer import *
+from .test_admin import *
+from .test_importtime import *
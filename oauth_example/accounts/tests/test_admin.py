@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.test.utils import override_settings
+
+from datetime import datetime, timedelta
+from mock import patch
+
+from accounts.models import Account
+
+from .test_commands import google_refresh_post
+from .test_fakeprovider import FakeProviderTestCase
+
+
+class AdminTestMixin(object):
+
+    def login_admin(self):
+        User.objects.create_superuser('admin', 'admin@email.com', '123456')
+        self.client.login(username='admin', password='123456')
+        self.url = reverse('admin:accounts_account_changelist')
+
+    def create_accounts(self, user):
+        now = datetime.now()
+        for i, expires_in in enumerate([
+            now - timedelta(hours=1), now + timedelta(minutes=5), now + timedelta(hours=1), None
+        ]):
+            Account.objects.create(
+                user=user,
+                provider='youtube' if expires_in else 'twitter',
+                provider_id=str(i),
+                provider_username='fulano{0}'.format(i),
+                oauth_token='token{0}'.format(i),
+                refresh_token='refresh{0}'.format(i) if expires_in else '',
+                expires_in=expires_in
+            )
+
+
+class TestAccountAdmin(AdminTestMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.login_admin()
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.create_accounts(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def usernames(self, response):
+        return sorted(a.provider_username for a in response.context['cl'].result_list)
+
+    def test_filters_and_search(self):
+        for expiry, usernames in (
+            ('expired', ['fulano0']),
+            ('expiring', ['fulano1']),
+            ('valid', ['fulano2']),
+            ('never', ['fulano3']),
+        ):
+            response = self.client.get(self.url, {'expiry': expiry})
+            self.assertEquals(self.usernames(response), usernames)
+
+        response = self.client.get(self.url, {'provider': 'twitter'})
+        self.assertEquals(self.usernames(response), ['fulano3'])
+
+        # prefix search only
+        response = self.client.get(self.url, {'q': 'fulano2'})
+        self.assertEquals(self.usernames(response), ['fulano2'])
+        response = self.client.get(self.url, {'q': 'lano'})
+        self.assertEquals(self.usernames(response), [])
+
+    def test_counts_are_cached(self):
+        response = self.client.get(self.url, {'provider': 'youtube'})
+        self.assertEquals(response.context['cl'].result_count, 3)
+        self.assertEquals(response.context['cl'].full_result_count, 4)
+
+        Account.objects.filter(provider_id='0').delete()
+        response = self.client.get(self.url, {'provider': 'youtube'})
+        self.assertEquals(response.context['cl'].result_count, 3)
+        self.assertEquals(len(response.context['cl'].result_list), 2)
+
+    def test_users_are_joined(self):
+        for i in range(10):
+            Account.objects.create(user=self.user, provider='twitter', provider_id='t{0}'.format(i))
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            # the admin user and the accounts joined with their users, the
+            # counts are cached
+            self.client.get(self.url)
+
+    @patch('accounts.sessions.PooledSession.post', google_refresh_post)
+    def test_refresh_action(self):
+        response = self.client.post(self.url, {
+            'action': 'refresh_selected',
+            ACTION_CHECKBOX_NAME: list(Account.objects.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, u'3 tokens renovados, 0 falhas.')
+        self.assertEquals(
+            Account.objects.filter(oauth_token='new_token').count(), 3
+        )
+
+
+    @override_settings(ACCOUNTS_ADMIN_ACTION_LIMIT=2)
+    @patch('accounts.admin.revoke_tokens')
+    @patch('accounts.admin.bulk_refresh')
+    def test_actions_limit_the_selection(self, bulk_refresh, revoke_tokens):
+        for action in ('refresh_selected', 'revoke_selected'):
+            response = self.client.post(self.url, {
+                'action': action,
+                ACTION_CHECKBOX_NAME: list(Account.objects.values_list('pk', flat=True)),
+            }, follow=True)
+            self.assertContains(response, u'Selecione no máximo 2 contas por vez.')
+        self.assertFalse(bulk_refresh.called)
+        self.assertFalse(revoke_tokens.called)
+
+
+class TestAccountAdminRevoke(AdminTestMixin, FakeProviderTestCase):
+
+    def test_revoke_action(self):
+        self.run_flow('facebook')
+        self.create_accounts(self.user)
+        self.login_admin()
+        # tokens inside the expiry margin would be refreshed by worker
+        # threads, which do not see the in-memory test database
+        selected = Account.objects.exclude(provider_id__in=['0', '1'])
+
+        response = self.client.post(self.url, {
+            'action': 'revoke_selected',
+            ACTION_CHECKBOX_NAME: list(selected.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, u'3 contas revogadas, 0 falhas nos provedores.')
+        self.assertEquals(
+            sorted(Account.objects.exclude(oauth_token='').values_list('provider_id', flat=True)),
+            ['0', '1']
+        )
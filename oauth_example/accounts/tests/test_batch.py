@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import threading
+
+from accounts.batch import parse_multipart
+from accounts.fakeprovider import (
+    FakeProvider, fake_provider_hosts, make_fake_provider_server
+)
+from accounts.models import Account
+from accounts.services import reset_services
+from accounts.sessions import pool_stats, reset_pool
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.server = make_fake_provider_server('127.0.0.1', 0, FakeProvider())
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        base = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.override = override_settings(ACCOUNTS_PROVIDER_HOSTS=fake_provider_hosts(base))
+        self.override.enable()
+        reset_services()
+        reset_pool()
+
+    def tearDown(self):
+        self.override.disable()
+        reset_services()
+        reset_pool()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def account(self, provider):
+        return Account(provider=provider, oauth_token='access-7', oauth_token_secret='secret')
+
+    def test_facebook(self):
+        batch = self.account('facebook').batch()
+        responses = [batch.get('me', params={'fields': 'id'}) for i in range(60)]
+        missing = batch.get('me/nothing')
+        self.assertEquals(len(batch.execute()), 61)
+
+        # 50 requests per graph batch
+        self.assertEquals(pool_stats()['requests'], 2)
+        self.assertEquals(len(batch), 0)
+        self.assertEquals(responses[0].status_code, 200)
+        self.assertEquals(responses[59].json()['username'], 'fake7')
+        self.assertEquals(missing.status_code, 404)
+        self.assertFalse(missing.ok)
+
+    def test_youtube(self):
+        batch = self.account('youtube').batch()
+        responses = [batch.get('https://www.googleapis.com/oauth2/v1/userinfo') for i in range(3)]
+        missing = batch.get('channels', params={'part': 'statistics', 'mine': 'true'})
+        batch.execute()
+
+        self.assertEquals(pool_stats()['requests'], 1)
+        self.assertEquals([r.json()['email'] for r in responses], ['fake7@example.com'] * 3)
+        self.assertEquals(responses[0].headers['Content-Type'], 'application/json')
+        self.assertEquals(missing.status_code, 404)
+
+    def test_twitter_without_batches(self):
+        batch = self.account('twitter').batch()
+        responses = [batch.get('account/verify_credentials.json') for i in range(2)]
+        batch.execute()
+        self.assertEquals(pool_stats()['requests'], 2)
+        self.assertEquals([r.json()['screen_name'] for r in responses], ['fake7'] * 2)
+
+    def test_parse_multipart(self):
+        content = (
+            '--b\r\nContent-Type: application/http\r\nContent-ID: <response-item1>\r\n\r\n'
+            'HTTP/1.1 204 No Content\r\nETag: "x"\r\n\r\n\r\n'
+            '--b\r\nContent-Type: application/http\r\nContent-ID: <response-item0>\r\n\r\n'
+            'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{"id": 1}\r\n'
+            '--b--\r\n'
+        )
+        parts = sorted(parse_multipart('multipart/mixed; boundary=b', content))
+        self.assertEquals([(index, status) for index, status, headers, body in parts], [(0, 200), (1, 204)])
+        self.assertEquals(parts[0][3].strip(), '{"id": 1}')
+        self.assertEquals(parts[1][2], {'ETag': '"x"'})
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from django.test import TransactionTestCase
+
+from accounts.benchmarks import run_benchmarks, compare
+
+
+class TestBenchmarks(TransactionTestCase):
+
+    def test_smoke(self):
+        results = run_benchmarks(sizes=(3,), iterations=2, refresh_size=4)
+        names = [result['name'] for result in results]
+        self.assertEquals(names.count('account_list'), 2)
+        self.assertEquals(names.count('callback'), 3)
+        self.assertEquals(names.count('get_client'), 3)
+        self.assertEquals(names.count('bulk_refresh'), 1)
+
+        cold, warm = results[:2]
+        self.assertEquals(cold['params'], {'accounts': 3, 'cached': False})
+        self.assertTrue(cold['queries_per_op'] > warm['queries_per_op'])
+        self.assertEquals(results[-1]['params']['failed'], 0)
+        self.assertEquals(results[-1]['operations'], 4)
+
+        changes = compare(results, results)
+        self.assertEquals(len(changes), len(results))
+        self.assertEquals(changes[0][1:], (0.0, 0.0))
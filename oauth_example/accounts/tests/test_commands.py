@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User
+
+from datetime import datetime, timedelta
+from StringIO import StringIO
+from mock import patch
+
+from accounts import instrumentation
+from accounts.models import Account
+
+
+def google_refresh_post(*args, **kwargs):
+
+    class GoogleRefresh(object):
+
+        def json(self):
+            return {'access_token': 'new_token', 'expires_in': 3600}
+
+    return GoogleRefresh()
+
+
+class TestRefreshTokensCommand(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.account = Account.objects.create(
+            user=self.user,
+            provider='youtube',
+            provider_id='1',
+            provider_username='fulano1',
+            oauth_token='old_token',
+            refresh_token='refresh_token',
+            expires_in=datetime.now() + timedelta(minutes=12)
+        )
+
+    @patch('accounts.sessions.PooledSession.post', google_refresh_post)
+    def test_refresh_ahead_of_margin(self):
+        stdout = StringIO()
+        call_command('refresh_tokens', window=5, stdout=stdout)
+        self.assertTrue('1 tokens refreshed, 0 failures' in stdout.getvalue())
+        account = Account.objects.get(pk=self.account.pk)
+        self.assertTrue(account.expires_in > datetime.now() + timedelta(minutes=50))
+
+    @patch('accounts.sessions.PooledSession.post', google_refresh_post)
+    def test_nothing_to_refresh(self):
+        stdout = StringIO()
+        call_command('refresh_tokens', stdout=stdout)
+        self.assertTrue('0 tokens refreshed, 0 failures' in stdout.getvalue())
+
+
+class TestProviderStatsCommand(TestCase):
+
+    def tearDown(self):
+        instrumentation.reset_all()
+
+    def test_table(self):
+        instrumentation.record('twitter', '/1.1/account/verify_credentials.json', 0.12, 200, 512)
+        stdout = StringIO()
+        call_command('provider_stats', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertTrue('/1.1/account/verify_credentials.json' in output)
+        self.assertTrue('<=250' in output)
+
+    def test_reset(self):
+        instrumentation.record('twitter', '/', 0.1, 200, 2)
+        call_command('provider_stats', reset=True)
+        self.assertEquals(instrumentation.collect()['calls'], {})
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+
+from urlparse import urlparse, parse_qsl
+import threading
+
+import requests
+
+from accounts.fakeprovider import (
+    FakeProvider, fake_provider_hosts, make_fake_provider_server
+)
+from accounts.models import Account
+from accounts.services import reset_services
+
+
+class FakeProviderTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeProvider(twitter_callback_url='http://testserver/')
+        self.server = make_fake_provider_server('127.0.0.1', 0, self.app)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        base = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.override = override_settings(ACCOUNTS_PROVIDER_HOSTS=fake_provider_hosts(base))
+        self.override.enable()
+        reset_services()
+
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.client.login(username='user1', password='123456')
+
+    def tearDown(self):
+        self.override.disable()
+        reset_services()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_flow(self, provider):
+        # app -> provider authorize dialog -> app callback
+        response = self.client.get(reverse('accounts_{0}_new'.format(provider)))
+        authorize = requests.get(response['Location'], allow_redirects=False)
+        params = dict(parse_qsl(urlparse(authorize.headers['Location']).query))
+        response = self.client.get(
+            reverse('accounts_{0}_callback'.format(provider)), params, follow=True
+        )
+        self.assertContains(response, u'Conta do {0} adicionada com sucesso.'.format(provider))
+        return Account.objects.get(user=self.user, provider=provider)
+
+
+class TestFakeProviderFlows(FakeProviderTestCase):
+
+    def test_twitter(self):
+        account = self.run_flow('twitter')
+        self.assertTrue(account.provider_username.startswith('fake'))
+        self.assertEquals(account.oauth_token_secret, 'access-secret')
+
+    def test_facebook(self):
+        account = self.run_flow('facebook')
+        self.assertEquals(account.provider_username, 'fake' + account.provider_id)
+
+    def test_youtube(self):
+        account = self.run_flow('youtube')
+        self.assertTrue(account.refresh_token.startswith('refresh-'))
+        self.assertEquals(account.provider_username, 'fake{0}@example.com'.format(account.provider_id))
+
+    def test_error_rate(self):
+        self.app.error_rate = 1
+        response = self.client.get(reverse('accounts_facebook_new'))
+        self.assertEquals(requests.get(response['Location']).status_code, 503)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from accounts.fanout import fan_out, profile_endpoints
+from accounts.models import Account
+from accounts.resilience import ProviderUnavailable, get_breaker
+
+from .test_sessions import LocalServerTestCase
+
+
+class TestFanOut(LocalServerTestCase):
+
+    def accounts(self, provider, count):
+        return [
+            Account(provider=provider, provider_id=str(i), oauth_token='token', oauth_token_secret='secret')
+            for i in range(count)
+        ]
+
+    def slow(self, provider):
+        return self.url + 'slow?tag=' + provider
+
+    def test_concurrent_calls(self):
+        results = list(fan_out(
+            self.accounts('facebook', 6) + self.accounts('twitter', 6),
+            {'facebook': self.slow('facebook'), 'twitter': self.slow('twitter')},
+            limits={'facebook': 3, 'twitter': 3}
+        ))
+        self.assertEquals(len(results), 12)
+        self.assertEquals([r.response.status_code for r in results], [200] * 12)
+        self.assertEquals([r.error for r in results], [None] * 12)
+        # calls of a provider overlapped, up to its limit
+        for provider in ('facebook', 'twitter'):
+            self.assertTrue(1 < self.server.overlap[provider] <= 3)
+
+    def test_limits(self):
+        results = list(fan_out(
+            self.accounts('facebook', 3) + self.accounts('twitter', 3),
+            {'facebook': self.slow('facebook'), 'twitter': self.slow('twitter')},
+            limits={'facebook': 1, 'twitter': 2}
+        ))
+        self.assertEquals(len(results), 6)
+        self.assertEquals(self.server.overlap['facebook'], 1)
+        self.assertTrue(self.server.overlap['twitter'] <= 2)
+
+    def test_callable_endpoints_and_errors(self):
+        for i in range(5):
+            get_breaker('twitter').failure()
+        results = list(fan_out(
+            self.accounts('facebook', 2) + self.accounts('twitter', 1) + self.accounts('youtube', 1),
+            {
+                'facebook': lambda account: self.url + '?id=' + account.provider_id,
+                'twitter': self.url,
+            }
+        ))
+        self.assertEquals(len(results), 3)
+        errors = [r for r in results if r.error]
+        self.assertEquals(len(errors), 1)
+        self.assertTrue(isinstance(errors[0].error, ProviderUnavailable))
+        self.assertEquals(
+            sorted(r.response.request.url[-4:] for r in results if r.response),
+            ['id=0', 'id=1']
+        )
+
+    def test_profile_endpoints(self):
+        self.assertEquals(profile_endpoints()['twitter'], 'account/verify_credentials.json')
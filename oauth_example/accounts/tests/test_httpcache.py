@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from accounts.httpcache import response_cache, cache_stats
+from accounts.models import Account
+from accounts.ratelimit import RateLimited
+from accounts.sessions import pool_stats
+
+from .test_sessions import LocalServerTestCase
+
+
+class TestResponseCache(LocalServerTestCase):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        response_cache.clear()
+        cache.clear()
+
+    def tearDown(self):
+        response_cache.clear()
+        cache.clear()
+        super(TestResponseCache, self).tearDown()
+
+    def client_for(self, pk, provider='facebook'):
+        return Account(pk=pk, provider=provider, oauth_token='token', oauth_token_secret='secret').get_client()
+
+    def test_revalidation(self):
+        client = self.client_for(1)
+        first = client.get(self.url + 'etag', params={'fields': 'id'})
+        second = client.get(self.url + 'etag', params={'fields': 'id'})
+        self.assertEquals(first.json(), {'id': 123})
+        self.assertEquals(second.json(), {'id': 123})
+        self.assertTrue(second.from_cache)
+        self.assertEquals(pool_stats()['requests'], 2)
+        self.assertEquals(cache_stats()['revalidated'], 1)
+        # the headers of the 304 are merged into the kept ones
+        self.assertEquals(second.headers['x-rate-limit-remaining'], '9')
+        self.assertEquals(second.headers['Content-Length'], '11')
+        self.assertEquals(client.get(self.url + 'etag', params={'fields': 'id'}).json(), {'id': 123})
+
+        # other accounts and other urls do not share answers
+        self.assertFalse(hasattr(self.client_for(2).get(self.url + 'etag'), 'from_cache'))
+        self.assertFalse(hasattr(client.get(self.url + 'etag'), 'from_cache'))
+
+    @override_settings(ACCOUNTS_HTTP_CACHE_TTL=60)
+    def test_fresh_answers_skip_the_network(self):
+        client = self.client_for(1, 'twitter')
+        client.get(self.url + 'etag')
+        self.assertEquals(client.get(self.url + 'etag').json(), {'id': 123})
+        self.assertEquals(pool_stats()['requests'], 1)
+        self.assertEquals(cache_stats()['hits'], 1)
+
+    @override_settings(ACCOUNTS_HTTP_CACHE_SIZE=2)
+    def test_lru(self):
+        client = self.client_for(1)
+        for path in ('etag?a', 'etag?b', 'etag?a', 'etag?c'):
+            client.get(self.url + path)
+        self.assertEquals(len(response_cache), 2)
+        # b was the least recently used
+        self.assertTrue(client.get(self.url + 'etag?a').from_cache)
+        self.assertFalse(hasattr(client.get(self.url + 'etag?b'), 'from_cache'))
+
+    @override_settings(ACCOUNTS_HTTP_CACHE_MAX_BYTES=25)
+    def test_max_bytes(self):
+        client = self.client_for(1)
+        for path in ('etag?a', 'etag?b', 'etag?c'):
+            client.get(self.url + path)
+        # bodies of 11 bytes, only two fit
+        self.assertEquals(len(response_cache), 2)
+        self.assertEquals(cache_stats()['bytes'], 22)
+        self.assertFalse(hasattr(client.get(self.url + 'etag?a'), 'from_cache'))
+
+    def test_without_validators_or_account(self):
+        client = self.client_for(1)
+        client.get(self.url)
+        self.assertEquals(len(response_cache), 0)
+        Account(provider='facebook', oauth_token='token').get_client().get(self.url + 'etag')
+        self.assertEquals(len(response_cache), 0)
+
+    @override_settings(ACCOUNTS_HTTP_CACHE=False)
+    def test_disabled(self):
+        self.client_for(1).get(self.url + 'etag')
+        self.assertEquals(len(response_cache), 0)
+
+    @override_settings(ACCOUNTS_HTTP_CACHE_TTL=60)
+    def test_rate_limited_client(self):
+        account = Account(pk=1, provider='twitter', oauth_token='token', oauth_token_secret='secret')
+        client = account.get_rate_limited_client(max_wait=0)
+        url = self.url + 'etag'
+        client.get(url)
+        bucket = client.bucket(url)
+        state = bucket.load()
+        state['tokens'] = 0.0
+        bucket.save(state)
+
+        # memory hits neither wait for the budget nor spend it
+        self.assertEquals(client.get(url).json(), {'id': 123})
+        self.assertEquals(pool_stats()['requests'], 1)
+        self.assertEquals(client.remaining(url)[0], 0)
+
+        with override_settings(ACCOUNTS_HTTP_CACHE_TTL=0):
+            # a revalidation reaches the provider
+            self.assertRaises(RateLimited, client.get, url)
+            state['tokens'] = 1.0
+            bucket.save(state)
+            self.assertTrue(client.get(url).from_cache)
+        # and the budget follows the headers of its 304
+        self.assertEquals(client.remaining(url)[0], 9)
+        self.assertEquals(pool_stats()['requests'], 2)
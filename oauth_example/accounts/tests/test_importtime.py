@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.test import TestCase
+
+import os
+import subprocess
+import sys
+
+from accounts.importtime import ImportProfiler
+
+
+class TestColdStart(TestCase):
+
+    def test_models_do_not_load_provider_libraries(self):
+        # a fresh interpreter, this one has loaded everything already
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, accounts.models, accounts.views, accounts.admin; '
+            'print sorted(m for m in ("requests", "rauth", "gevent") if m in sys.modules)'
+        ], cwd=os.path.dirname(settings.PROJECT_PATH), env=dict(
+            os.environ, DJANGO_SETTINGS_MODULE='oauth_example.settings'
+        ))
+        self.assertEquals(output.strip(), '[]')
+
+    def test_profiler(self):
+        sys.modules.pop('wave', None)
+        sys.modules.pop('chunk', None)
+        with ImportProfiler() as profiler:
+            import wave
+        records = dict((name, (own, total)) for name, own, total in profiler.top())
+        self.assertTrue('wave' in records)
+        self.assertTrue('chunk' in records)
+        self.assertTrue(records['wave'][1] >= records['chunk'][1])
+        self.assertTrue(records['wave'][0] <= records['wave'][1])
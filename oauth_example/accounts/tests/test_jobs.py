@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+
+from datetime import datetime, timedelta
+from mock import patch
+
+from accounts.jobs import process_jobs, cleanup_jobs
+from accounts.models import Account, AccountProfile, CallbackJob
+
+
+def facebook_complete(self, params):
+    if params['code'] == 'broken':
+        raise ValueError('invalid code')
+    return (
+        {'oauth_token': 'token_' + params['code']},
+        {
+            'provider_id': params['code'],
+            'provider_username': 'fulano_' + params['code'],
+            'data': {'id': params['code'], 'name': 'Fulano ' + params['code']},
+        }
+    )
+
+
+class InlinePool(object):
+    # the in-memory test database is not shared with other threads
+    map = staticmethod(map)
+
+
+@override_settings(ACCOUNTS_ASYNC_CALLBACKS=True)
+class TestCallbackJobs(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.client.login(username='user1', password='123456')
+
+    def test_callback_is_queued(self):
+        response = self.client.get(
+            reverse('accounts_facebook_callback'), {'code': 'code'}, follow=True
+        )
+        self.assertRedirects(response, reverse('accounts_account_list'))
+        self.assertContains(response, u'A conta do facebook está sendo adicionada.')
+        self.assertContains(response, u'Pendente...')
+
+        job = CallbackJob.objects.get()
+        self.assertEquals(job.user, self.user)
+        self.assertEquals(job.get_params(), {'code': 'code'})
+        self.assertFalse(Account.objects.exists())
+
+    @patch('accounts.providers.Provider.complete', facebook_complete)
+    def test_worker(self):
+        for code in ('1', 'broken', '2'):
+            CallbackJob.objects.enqueue(self.user, 'facebook', {'code': code})
+
+        self.assertEquals(process_jobs(InlinePool(), batch=2), (1, 1))
+        self.assertEquals(process_jobs(InlinePool(), batch=2), (1, 0))
+        self.assertEquals(process_jobs(InlinePool(), batch=2), (0, 0))
+
+        self.assertEquals(
+            sorted(Account.objects.values_list('provider_username', flat=True)),
+            ['fulano_1', 'fulano_2']
+        )
+        self.assertEquals(
+            sorted(AccountProfile.objects.values_list('name', flat=True)),
+            ['Fulano 1', 'Fulano 2']
+        )
+        failed = CallbackJob.objects.get(status=CallbackJob.FAILED)
+        self.assertEquals(failed.error, u'invalid code')
+        self.assertEquals(failed.params, '')
+
+        # finished jobs are shown once as messages
+        response = self.client.get(reverse('accounts_account_list'))
+        self.assertContains(response, u'Conta do facebook adicionada com sucesso.')
+        self.assertContains(response, u'Ocorreu um erro ao adicionar a conta do facebook.')
+        self.assertFalse(CallbackJob.objects.exists())
+
+    def test_claim_once(self):
+        CallbackJob.objects.enqueue(self.user, 'facebook', {'code': '1'})
+        self.assertEquals(len(CallbackJob.objects.claim(10)), 1)
+        self.assertEquals(CallbackJob.objects.claim(10), [])
+
+    def test_cleanup(self):
+        stale = CallbackJob.objects.enqueue(self.user, 'youtube', {'code': '1'})
+        old = CallbackJob.objects.enqueue(self.user, 'youtube', {'code': '2'})
+        CallbackJob.objects.filter(pk=stale.pk).update(
+            status=CallbackJob.RUNNING, updated_on=datetime.now() - timedelta(minutes=10)
+        )
+        CallbackJob.objects.filter(pk=old.pk).update(
+            status=CallbackJob.DONE, updated_on=datetime.now() - timedelta(days=2)
+        )
+        cleanup_jobs()
+        self.assertEquals(
+            list(CallbackJob.objects.values_list('pk', 'status')),
+            [(stale.pk, CallbackJob.FAILED)]
+        )
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+
+from datetime import datetime, timedelta
+from mock import Mock, patch
+import threading
+import time
+
+from accounts.locks import KeyedLock
+from accounts.models import Account, get_account_list
+from accounts.refresh import _background_refresh
+from accounts.resilience import ProviderUnavailable, get_breaker, reset_breakers
+
+
+class TestAccountExpiring(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.soon = Account.objects.create(
+            user=self.user,
+            provider='youtube',
+            provider_id='1',
+            provider_username='fulano1',
+            refresh_token='refresh_token',
+            expires_in=datetime.now() + timedelta(minutes=5)
+        )
+        self.later = Account.objects.create(
+            user=self.user,
+            provider='youtube',
+            provider_id='2',
+            provider_username='fulano2',
+            refresh_token='refresh_token',
+            expires_in=datetime.now() + timedelta(minutes=30)
+        )
+        self.facebook = Account.objects.create(
+            user=self.user,
+            provider='facebook',
+            provider_id='3',
+            provider_username='fulano3',
+            expires_in=datetime.now() + timedelta(minutes=5)
+        )
+
+    def test_is_expired(self):
+        self.assertTrue(self.soon.is_expired())
+        self.assertFalse(self.later.is_expired())
+        self.assertTrue(self.later.is_expired(timedelta(minutes=40)))
+
+    def test_expiring(self):
+        self.assertEquals(list(Account.objects.expiring()), [self.soon])
+        self.assertEquals(
+            set(Account.objects.expiring(timedelta(minutes=40))),
+            set([self.soon, self.later])
+        )
+
+
+def google_refresh_post(*args, **kwargs):
+
+    class GoogleRefresh(object):
+
+        def json(self):
+            return {'access_token': 'new_token', 'expires_in': 3600}
+
+    return GoogleRefresh()
+
+
+class TestGoogleRefreshToken(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.account = Account.objects.create(
+            user=self.user,
+            provider='youtube',
+            provider_id='1',
+            provider_username='fulano1',
+            oauth_token='old_token',
+            refresh_token='refresh_token',
+            expires_in=datetime.now() + timedelta(minutes=5)
+        )
+
+    def test_refresh_is_stored_in_oauth_token(self):
+        with patch('accounts.sessions.PooledSession.post', google_refresh_post):
+            self.assertEquals(self.account.get_client().access_token, 'new_token')
+        account = Account.objects.get(pk=self.account.pk)
+        self.assertEquals(account.oauth_token, 'new_token')
+        self.assertFalse(account.is_expired())
+
+    def test_concurrent_refresh_reuses_stored_token(self):
+        stale = Account.objects.get(pk=self.account.pk)
+        post = Mock(side_effect=google_refresh_post)
+        with patch('accounts.sessions.PooledSession.post', post):
+            self.account.google_refresh_token()
+            stale.google_refresh_token()
+        self.assertEquals(post.call_count, 1)
+        self.assertEquals(stale.oauth_token, 'new_token')
+        self.assertFalse(stale.is_expired())
+
+
+class TestKeyedLock(TestCase):
+
+    def test_same_key_is_serialized(self):
+        lock = KeyedLock()
+        running = []
+        overlaps = []
+
+        def work():
+            with lock(1):
+                running.append(1)
+                overlaps.append(len(running))
+                time.sleep(0.01)
+                running.pop()
+
+        threads = [threading.Thread(target=work) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(overlaps, [1] * 5)
+        self.assertEquals(len(lock), 0)
+
+
+class TestStaleWhileRevalidate(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.account = Account.objects.create(
+            user=self.user,
+            provider='youtube',
+            provider_id='1',
+            provider_username='fulano1',
+            oauth_token='old_token',
+            refresh_token='refresh_token',
+            expires_in=datetime.now() + timedelta(minutes=5)
+        )
+
+    @patch('accounts.refresh.refresh_in_background')
+    def test_grace_window_refreshes_in_background(self, refresh_in_background):
+        post = Mock(side_effect=google_refresh_post)
+        with patch('accounts.sessions.PooledSession.post', post):
+            client = self.account.get_client(stale_while_revalidate=True)
+        self.assertEquals(client.access_token, 'old_token')
+        self.assertEquals(post.call_count, 0)
+        refresh_in_background.assert_called_once_with(self.account)
+
+    @patch('accounts.refresh.refresh_in_background')
+    def test_really_expired_refreshes_inline(self, refresh_in_background):
+        self.account.expires_in = datetime.now() - timedelta(minutes=1)
+        self.account.save()
+        with patch('accounts.sessions.PooledSession.post', google_refresh_post):
+            client = self.account.get_client(stale_while_revalidate=True)
+        self.assertEquals(client.access_token, 'new_token')
+        self.assertFalse(refresh_in_background.called)
+
+    @patch('accounts.refresh.connection')
+    def test_background_refresh(self, connection):
+        # run on the test thread, whose connection must stay open
+        with patch('accounts.sessions.PooledSession.post', google_refresh_post):
+            _background_refresh(self.account.pk)
+        self.assertEquals(Account.objects.get(pk=self.account.pk).oauth_token, 'new_token')
+        self.assertTrue(connection.close.called)
+
+
+class TestAccountUpsert(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+
+    def upsert_twice(self):
+        account = Account.objects.upsert(
+            self.user, 'twitter', '1',
+            provider_username='fulano', oauth_token='token1'
+        )
+        self.assertEquals(account.oauth_token, 'token1')
+        self.assertEquals(account.user, self.user)
+
+        updated = Account.objects.upsert(
+            self.user, 'twitter', '1',
+            provider_username='fulano2', oauth_token='token2',
+            oauth_token_secret='secret2'
+        )
+        self.assertEquals(updated.pk, account.pk)
+        self.assertEquals(updated.created_on, account.created_on)
+
+        account = Account.objects.get()
+        self.assertEquals(account.provider_username, 'fulano2')
+        self.assertEquals(account.oauth_token, 'token2')
+        self.assertEquals(account.oauth_token_secret, 'secret2')
+
+    def test_upsert_statement(self):
+        self.upsert_twice()
+
+    @patch('accounts.models._supports_upsert', Mock(return_value=False))
+    def test_upsert_fallback(self):
+        self.upsert_twice()
+
+    @patch('accounts.models._supports_upsert', Mock(return_value=False))
+    def test_upsert_fallback_invalidates_list(self):
+        Account.objects.upsert(self.user, 'twitter', '1', provider_username='fulano')
+        self.assertEquals(get_account_list(self.user)[0].provider_username, 'fulano')
+        Account.objects.upsert(self.user, 'twitter', '1', provider_username='fulano2')
+        self.assertEquals(get_account_list(self.user)[0].provider_username, 'fulano2')
+
+    def test_unique_account(self):
+        Account.objects.create(user=self.user, provider='twitter', provider_id='1')
+        self.assertRaises(
+            IntegrityError,
+            Account.objects.create,
+            user=self.user, provider='twitter', provider_id='1'
+        )
+
+
+class TestGetClientAsync(TestCase):
+
+    def tearDown(self):
+        reset_breakers()
+
+    def test_get_client_async(self):
+        result = Account(provider='facebook', oauth_token='token').get_client_async()
+        self.assertEquals(result.get(5).access_token, 'token')
+
+    def test_errors_are_raised_by_get(self):
+        for i in range(5):
+            get_breaker('twitter').failure()
+        result = Account(provider='twitter', oauth_token='token').get_client_async()
+        self.assertRaises(ProviderUnavailable, result.get, 5)
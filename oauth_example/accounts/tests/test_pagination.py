@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from mock import patch
+import threading
+
+from accounts.models import Account
+from accounts.pagination import iter_pages
+
+
+class FakeResponse(object):
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeClient(object):
+    # serves canned pages and records the requests
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        self.requested = threading.Event()
+
+    def get(self, url, params=None):
+        self.requests.append((url, params))
+        self.requested.set()
+        return FakeResponse(self.pages[len(self.requests) - 1])
+
+
+class TestPagination(TestCase):
+
+    def paginate(self, provider, pages, url, params=None, **kwargs):
+        self.client = FakeClient(pages)
+        account = Account(provider=provider, oauth_token='token')
+        with patch.object(Account, 'get_client', lambda account: self.client):
+            return list(account.paginate(url, params, **kwargs))
+
+    def test_twitter_cursor(self):
+        items = self.paginate('twitter', [
+            {'ids': [1, 2], 'next_cursor_str': '10'},
+            {'ids': [3], 'next_cursor_str': '0'},
+        ], 'followers/ids.json', {'count': 2})
+        self.assertEquals(items, [1, 2, 3])
+        self.assertEquals(self.client.requests[1][1], {'count': 2, 'cursor': '10'})
+
+    def test_twitter_timeline(self):
+        items = self.paginate('twitter', [
+            [{'id': 30}, {'id': 20}],
+            [{'id': 10}],
+            [],
+        ], 'statuses/user_timeline.json')
+        self.assertEquals([item['id'] for item in items], [30, 20, 10])
+        self.assertEquals(self.client.requests[1][1], {'max_id': 19})
+
+    def test_facebook_paging_next(self):
+        items = self.paginate('facebook', [
+            {'data': [1, 2], 'paging': {'next': 'https://graph.facebook.com/me/feed?after=x'}},
+            {'data': [3], 'paging': {}},
+        ], 'me/feed')
+        self.assertEquals(items, [1, 2, 3])
+        self.assertEquals(
+            self.client.requests[1],
+            ('https://graph.facebook.com/me/feed?after=x', {})
+        )
+
+    def test_youtube_page_token(self):
+        items = self.paginate('youtube', [
+            {'items': [1], 'nextPageToken': 'abc'},
+            {'items': [2]},
+        ], 'playlistItems', {'part': 'snippet'}, max_pages=5)
+        self.assertEquals(items, [1, 2])
+        self.assertEquals(self.client.requests[1][1], {'part': 'snippet', 'pageToken': 'abc'})
+
+    def test_max_pages(self):
+        items = self.paginate('youtube', [
+            {'items': [1], 'nextPageToken': 'a'},
+            {'items': [2], 'nextPageToken': 'b'},
+            {'items': [3]},
+        ], 'playlistItems', max_pages=2)
+        self.assertEquals(items, [1, 2])
+        self.assertEquals(len(self.client.requests), 2)
+
+    def test_prefetch(self):
+        self.client = FakeClient([
+            {'items': [1, 2], 'nextPageToken': 'a'},
+            {'items': [3]},
+        ])
+        account = Account(provider='youtube', oauth_token='token')
+        with patch.object(Account, 'get_client', lambda account: self.client):
+            pages = iter_pages(account, 'playlistItems')
+            self.assertEquals(next(pages), [1, 2])
+            # the second page is on its way before the first is consumed
+            self.client.requested.clear()
+            if len(self.client.requests) < 2:
+                self.assertTrue(self.client.requested.wait(5))
+            self.assertEquals(next(pages), [3])
+            self.assertRaises(StopIteration, next, pages)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+
+from datetime import datetime, timedelta
+
+from accounts.models import Account, AccountProfile
+from accounts.profiles import refresh_profiles
+
+from .test_fakeprovider import FakeProviderTestCase
+
+
+class TestProfileSnapshots(FakeProviderTestCase):
+
+    def test_snapshot_from_callback(self):
+        account = self.run_flow('twitter')
+        profile = account.profile
+        self.assertEquals(profile.name, 'Fake User {0}'.format(account.provider_id))
+        self.assertEquals(profile.get_data()['screen_name'], account.provider_username)
+
+        # storing it again hands back the updated row
+        stored = AccountProfile.objects.store(account, profile.get_data())
+        self.assertEquals(stored.pk, profile.pk)
+        self.assertTrue(stored.fetched_on >= profile.fetched_on)
+
+        # the list renders from the snapshot, the provider is not called
+        self.app.error_rate = 1
+        response = self.client.get(reverse('accounts_account_list'))
+        self.assertContains(response, profile.name)
+
+    def test_refresh_stale(self):
+        fresh = self.run_flow('facebook')
+        stale = self.run_flow('youtube')
+        missing = Account.objects.create(
+            user=self.user, provider='twitter', provider_id='1',
+            provider_username='fake1', oauth_token='access-1', oauth_token_secret='secret'
+        )
+        AccountProfile.objects.filter(account=stale).update(
+            name='', fetched_on=datetime.now() - timedelta(days=2)
+        )
+
+        self.assertEquals(
+            sorted(Account.objects.stale_profiles(3600).values_list('pk', flat=True)),
+            [stale.pk, missing.pk]
+        )
+        with override_settings(ACCOUNTS_PROFILE_TTL=3600):
+            report = refresh_profiles(chunk_size=1)
+        self.assertEquals((report.refreshed, report.failed), (2, 0))
+        self.assertTrue(u'2 profiles refreshed, 0 failures' in unicode(report))
+        self.assertFalse(Account.objects.stale_profiles(3600).exists())
+
+        self.assertEquals(
+            AccountProfile.objects.get(account=stale).name,
+            'Fake User {0}'.format(stale.provider_id)
+        )
+        self.assertEquals(AccountProfile.objects.get(account=missing).name, 'Fake User 1')
+
+        # refreshed snapshots show up on the cached list
+        response = self.client.get(reverse('accounts_account_list'))
+        self.assertContains(response, 'Fake User {0}'.format(stale.provider_id))
+        self.assertContains(response, 'Fake User {0}'.format(fresh.provider_id))
+
+    def test_failures_are_counted(self):
+        account = self.run_flow('facebook')
+        AccountProfile.objects.all().delete()
+        self.app.error_rate = 1
+        report = refresh_profiles()
+        self.assertEquals((report.refreshed, report.failed), (0, 1))
+        self.assertFalse(AccountProfile.objects.filter(account=account).exists())
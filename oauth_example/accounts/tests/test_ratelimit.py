@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from mock import patch
+import json
+import time
+
+from requests.structures import CaseInsensitiveDict
+
+from accounts.models import Account
+from accounts.ratelimit import RateLimited, remaining_budgets
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, headers=None, data=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.data = data or {}
+
+    def json(self):
+        return self.data
+
+
+class FakeClient(object):
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return self.responses.pop(0) if self.responses else FakeResponse()
+
+
+class TestRateLimit(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.twitter = Account(pk=1, provider='twitter', oauth_token='token', oauth_token_secret='secret')
+        self.facebook = Account(pk=2, provider='facebook', oauth_token='token')
+        self.youtube = Account(pk=3, provider='youtube', oauth_token='token')
+
+    def rate_limited(self, account, *responses, **kwargs):
+        fake = FakeClient(*responses)
+        with patch.object(Account, 'get_client', lambda account: fake):
+            return account.get_rate_limited_client(**kwargs), fake
+
+    def test_default_budget(self):
+        client, fake = self.rate_limited(self.twitter, max_wait=0)
+        for i in range(15):
+            client.get('statuses/user_timeline.json')
+        self.assertRaises(RateLimited, client.get, 'statuses/user_timeline.json')
+        self.assertEquals(len(fake.calls), 15)
+
+        # relative and absolute urls share the bucket, other endpoints do not
+        self.assertRaises(
+            RateLimited, client.get, 'https://api.twitter.com/1.1/statuses/user_timeline.json'
+        )
+        self.assertEquals(client.remaining('account/verify_credentials.json'), (15, 0))
+
+    def test_twitter_headers(self):
+        reset = int(time.time()) + 600
+        client, fake = self.rate_limited(self.twitter, FakeResponse(headers={
+            'x-rate-limit-limit': '180',
+            'x-rate-limit-remaining': '0',
+            'x-rate-limit-reset': str(reset),
+        }), max_wait=0)
+        client.get('search/tweets.json')
+        remaining, wait = client.remaining('search/tweets.json')
+        self.assertEquals(remaining, 0)
+        self.assertTrue(590 < wait <= 600)
+
+        with patch('time.time', lambda: reset + 1):
+            self.assertEquals(client.remaining('search/tweets.json'), (180, 0))
+
+    def test_facebook_usage_and_errors(self):
+        client, fake = self.rate_limited(
+            self.facebook,
+            FakeResponse(headers={'x-app-usage': json.dumps({'call_count': 90, 'total_time': 10})}),
+            FakeResponse(400, data={'error': {'code': 17, 'message': 'User request limit reached'}}),
+            max_wait=0
+        )
+        client.get('me/feed')
+        self.assertEquals(client.remaining('me/feed')[0], 20)
+        client.get('me/feed')
+        remaining, wait = client.remaining('me/feed')
+        self.assertEquals(remaining, 0)
+        self.assertTrue(wait > 50)
+
+    @override_settings(ACCOUNTS_RATELIMIT_COOLDOWN=600)
+    def test_google_errors_and_retry_after(self):
+        client, fake = self.rate_limited(
+            self.youtube,
+            FakeResponse(403, data={'error': {'errors': [{'reason': 'userRateLimitExceeded'}]}}),
+            max_wait=0
+        )
+        client.get('channels')
+        self.assertTrue(client.remaining('channels')[1] > 500)
+
+        client, fake = self.rate_limited(
+            self.youtube, FakeResponse(429, headers={'Retry-After': '0.05'}), max_wait=1
+        )
+        client.get('playlists')
+        client.get('playlists')
+        self.assertEquals(len(fake.calls), 2)
+
+    def test_remaining_budgets(self):
+        client, fake = self.rate_limited(self.youtube)
+        client.get('channels')
+        budgets = remaining_budgets([self.facebook, self.youtube], 'channels')
+        self.assertEquals(budgets[self.facebook], (200, 0))
+        self.assertEquals(budgets[self.youtube], (99, 0))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+
+from datetime import datetime, timedelta
+from mock import patch
+
+from accounts.models import Account
+from accounts.refresh import RefreshReport, bulk_refresh, iter_chunks
+
+
+def google_refresh_post(self, url, data=None, **kwargs):
+
+    class GoogleRefresh(object):
+
+        def json(self):
+            if data['refresh_token'] == 'broken':
+                raise ValueError('No JSON object could be decoded')
+            return {'access_token': 'new_' + data['refresh_token'], 'expires_in': 3600}
+
+    return GoogleRefresh()
+
+
+class TestRefreshReport(TestCase):
+
+    @patch('accounts.refresh.LATENCY_SAMPLE_SIZE', 100)
+    def test_latencies_are_sampled(self):
+        report = RefreshReport()
+        for i in range(1000):
+            report.add_latency(i / 1000.0)
+        self.assertEquals(len(report.latencies), 100)
+        self.assertEquals(report.timed, 1000)
+        self.assertTrue(0.3 < report.percentile(50) < 0.7)
+
+
+class TestBulkRefresh(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        for i in range(7):
+            Account.objects.create(
+                user=self.user,
+                provider='youtube',
+                provider_id=str(i),
+                provider_username='fulano{0}'.format(i),
+                oauth_token='old_token',
+                refresh_token='broken' if i == 3 else 'token{0}'.format(i),
+                expires_in=datetime.now() + timedelta(minutes=1)
+            )
+
+    @patch('accounts.sessions.PooledSession.post', google_refresh_post)
+    def test_bulk_refresh(self):
+        report = bulk_refresh(workers=3, chunk_size=2)
+        self.assertEquals(report.refreshed, 6)
+        self.assertEquals(report.failed, 1)
+        self.assertEquals(len(report.latencies), 7)
+        self.assertTrue(u'6 tokens refreshed, 1 failures' in unicode(report))
+
+        account = Account.objects.get(provider_id='0')
+        self.assertEquals(account.oauth_token, 'new_token0')
+        self.assertFalse(account.is_expired())
+        self.assertEquals(list(Account.objects.expiring()), [
+            Account.objects.get(provider_id='3')
+        ])
+
+    @patch('accounts.sessions.PooledSession.post', google_refresh_post)
+    def test_rows_refreshed_meanwhile_are_kept(self):
+        later = datetime.now() + timedelta(hours=2)
+
+        def chunks(queryset, chunk_size):
+            for chunk in iter_chunks(queryset, chunk_size):
+                # get_client() refreshes this one while the chunk is out
+                Account.objects.filter(provider_id='5').update(oauth_token='fresh', expires_in=later)
+                yield chunk
+
+        with patch('accounts.refresh.iter_chunks', chunks):
+            report = bulk_refresh(workers=3)
+        self.assertEquals(report.refreshed, 6)
+        self.assertEquals(Account.objects.get(provider_id='5').oauth_token, 'fresh')
+        self.assertEquals(Account.objects.get(provider_id='4').oauth_token, 'new_token4')
+
+        # accounts without an expiry have no guard to compare
+        Account.objects.filter(provider_id='6').update(expires_in=None)
+        bulk_refresh(Account.objects.filter(provider_id='6'))
+        self.assertEquals(Account.objects.get(provider_id='6').oauth_token, 'new_token6')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from accounts.models import (
+    Account, PROVIDER_CHOICES, REFRESHABLE_PROVIDERS,
+    get_twitter_service, get_facebook_service, get_youtube_service
+)
+from accounts.providers import PROVIDER_LIST, get_provider
+from accounts.services import get_service, reset_services
+
+
+class TestServiceRegistry(TestCase):
+
+    def tearDown(self):
+        reset_services()
+
+    def test_service_is_built_once(self):
+        self.assertTrue(get_twitter_service() is get_twitter_service())
+        self.assertTrue(get_facebook_service() is get_service('facebook'))
+        self.assertTrue(get_youtube_service() is get_service('youtube'))
+
+    def test_reset_services(self):
+        twitter = get_twitter_service()
+        reset_services()
+        self.assertFalse(twitter is get_twitter_service())
+        self.assertEquals(get_twitter_service().name, 'twitter')
+
+
+class TestProviderRegistry(TestCase):
+
+    def tearDown(self):
+        reset_services()
+
+    def test_choices_follow_registry(self):
+        self.assertEquals(
+            [name for name, label in PROVIDER_CHOICES],
+            [provider.name for provider in PROVIDER_LIST]
+        )
+        self.assertEquals(REFRESHABLE_PROVIDERS, ('youtube',))
+
+    def test_authorize_url_is_precomputed(self):
+        provider = get_provider('facebook')
+        url = provider.get_authorize_url(None)
+        self.assertEquals(provider.authorize_url_template, url)
+        self.assertTrue(provider.get_authorize_url(None) is url)
+
+    def test_get_client_dispatch(self):
+        account = Account(provider='twitter', oauth_token='a', oauth_token_secret='b')
+        self.assertEquals(account.get_client().access_token_secret, 'b')
+        self.assertEquals(Account(provider='myspace').get_client(), None)
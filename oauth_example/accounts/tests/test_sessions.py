@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+from django.test.utils import override_settings
+
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs
+
+import json
+
+import requests
+from mock import patch, Mock
+from rauth import OAuth2Service
+
+from accounts import instrumentation
+from accounts.models import Account
+from accounts.resilience import (
+    ProviderUnavailable, get_breaker, reset_breakers, OPEN, CLOSED
+)
+from accounts.sessions import (
+    PooledSession, PooledOAuth2Session, shared_adapter, pool_stats, reset_pool
+)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        # calls to /slow?tag=... running at once, and the most seen per tag
+        self.in_flight = {}
+        self.overlap = {}
+        self.lock = threading.Lock()
+
+    def track(self, tag, delta):
+        with self.lock:
+            self.in_flight[tag] = self.in_flight.get(tag, 0) + delta
+            self.overlap[tag] = max(self.overlap.get(tag, 0), self.in_flight[tag])
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/etag'):
+            return self.etag()
+        path, _, query = self.path.partition('?')
+        if path == '/slow':
+            tag = parse_qs(query).get('tag', [''])[0]
+            self.server.track(tag, 1)
+            time.sleep(0.2)
+            self.server.track(tag, -1)
+        status = 503 if self.path == '/fail' else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def etag(self):
+        # answers 304 to a client that already has "v1"
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('x-rate-limit-remaining', '9')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '11')
+        self.end_headers()
+        self.wfile.write('{"id": 123}')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServerTestCase(TestCase):
+
+    def setUp(self):
+        reset_pool()
+        reset_breakers()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.url = 'http://127.0.0.1:{0}/'.format(self.server.server_port)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        reset_pool()
+        reset_breakers()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def service_session(self, name='facebook'):
+        # a provider session whose base_url is the local server
+        service = OAuth2Service(
+            client_id='id', client_secret='secret', name=name,
+            base_url=self.url, session_obj=PooledOAuth2Session
+        )
+        return service.get_session('token')
+
+
+class TestSharedPool(LocalServerTestCase):
+
+    def test_client_uses_shared_pool(self):
+        account = Account(provider='facebook', oauth_token='token')
+        client = account.get_client()
+        self.assertTrue(client.get_adapter('https://graph.facebook.com/') is shared_adapter)
+
+    def test_connections_are_reused_between_sessions(self):
+        for i in range(3):
+            session = PooledSession()
+            self.assertEquals(session.get(self.url).content, 'ok')
+            session.close()
+        stats = pool_stats()
+        self.assertEquals(stats['requests'], 3)
+        self.assertEquals(stats['misses'], 1)
+        self.assertEquals(stats['hits'], 2)
+
+    def test_recycled_pool_is_closed(self):
+        PooledSession().get(self.url)
+        old = shared_adapter.get_adapter()
+        old.close = Mock(wraps=old.close)
+        with override_settings(ACCOUNTS_HTTP_CONNECTION_LIFETIME=-1):
+            self.assertEquals(PooledSession().get(self.url).content, 'ok')
+        self.assertEquals(pool_stats()['recycled'], 1)
+        # a send still holds it
+        self.assertFalse(old.close.called)
+        shared_adapter.release(old)
+        self.assertTrue(old.close.called)
+
+
+class TestInstrumentation(LocalServerTestCase):
+
+    def setUp(self):
+        super(TestInstrumentation, self).setUp()
+        instrumentation.reset_all()
+        instrumentation.enable()
+
+    def tearDown(self):
+        instrumentation.enable(False)
+        instrumentation.reset_all()
+        super(TestInstrumentation, self).tearDown()
+
+    def test_disabled(self):
+        instrumentation.enable(False)
+        PooledSession('twitter').get(self.url)
+        self.assertEquals(instrumentation.collect()['calls'], {})
+
+    @override_settings(ACCOUNTS_HTTP_RETRIES=0)
+    def test_collect(self):
+        session = PooledSession('youtube')
+        session.get(self.url)
+        session.get(self.url + 'fail')
+        stats = instrumentation.collect()
+
+        entry = stats['calls']['youtube']['/']
+        self.assertEquals(entry['count'], 1)
+        self.assertEquals(entry['bytes'], 2)
+        self.assertEquals(entry['status'], {'200': 1})
+        self.assertEquals(entry['errors'], 0)
+        self.assertEquals(sum(entry['buckets']), 1)
+        self.assertEquals(stats['calls']['youtube']['/fail']['errors'], 1)
+        self.assertEquals(stats['pool']['requests'], 2)
+
+    @override_settings(ACCOUNTS_HTTP_TIMEOUT=(1, 0.05), ACCOUNTS_HTTP_RETRIES=0)
+    def test_relative_urls(self):
+        session = self.service_session()
+        self.assertRaises(requests.Timeout, session.get, 'slow')
+        with override_settings(ACCOUNTS_HTTP_TIMEOUT=(1, 1)):
+            session.get('slow')
+
+        # failures and successes of an endpoint share its row
+        entry = instrumentation.collect()['calls']['facebook']['/slow']
+        self.assertEquals(entry['count'], 2)
+        self.assertEquals(entry['status'], {'200': 1, 'error': 1})
+
+    def test_staff_only_view(self):
+        PooledSession('facebook').get(self.url)
+        url = reverse('accounts_provider_stats')
+        User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.client.login(username='user1', password='123456')
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        self.assertFalse(response['Content-Type'].startswith('application/json'))
+
+        User.objects.filter(username='user1').update(is_staff=True)
+        response = self.client.get(url)
+        self.assertEquals(response['Content-Type'], 'application/json')
+        stats = json.loads(response.content)
+        self.assertEquals(stats['calls']['facebook']['/']['count'], 1)
+
+
+@override_settings(
+    ACCOUNTS_HTTP_RETRY_BACKOFF=0,
+    ACCOUNTS_BREAKER_FAILURES=2,
+    ACCOUNTS_BREAKER_RESET_TIMEOUT=60
+)
+class TestResilience(LocalServerTestCase):
+
+    def test_idempotent_calls_are_retried(self):
+        r = PooledSession('youtube').get(self.url + 'fail')
+        self.assertEquals(r.status_code, 503)
+        self.assertEquals(pool_stats()['requests'], 3)
+        self.assertEquals(get_breaker('youtube').failures, 1)
+
+    def test_posts_are_not_retried(self):
+        PooledSession('youtube').post(self.url + 'fail', data={'a': 1})
+        self.assertEquals(pool_stats()['requests'], 1)
+        PooledSession('youtube').post(self.url + 'fail', data={'a': 1}, idempotent=True)
+        self.assertEquals(pool_stats()['requests'], 4)
+
+    @override_settings(ACCOUNTS_HTTP_TIMEOUT=(1, 0.05), ACCOUNTS_HTTP_RETRIES=0)
+    def test_timeout(self):
+        self.assertRaises(requests.Timeout, PooledSession('twitter').get, self.url + 'slow')
+        with override_settings(ACCOUNTS_HTTP_TIMEOUTS={'twitter': {'/slow': (1, 1)}}):
+            self.assertEquals(PooledSession('twitter').get(self.url + 'slow').status_code, 200)
+
+    @override_settings(
+        ACCOUNTS_HTTP_TIMEOUT=(1, 0.05), ACCOUNTS_HTTP_TIMEOUTS={'facebook': {'/slow': (1, 1)}}
+    )
+    def test_timeout_of_relative_url(self):
+        self.assertEquals(self.service_session().get('slow').status_code, 200)
+
+    @override_settings(ACCOUNTS_HTTP_RETRIES=0)
+    def test_breaker(self):
+        session = PooledSession('facebook')
+        session.get(self.url + 'fail')
+        session.get(self.url)
+        session.get(self.url + 'fail')
+        self.assertEquals(get_breaker('facebook').state, CLOSED)
+        session.get(self.url + 'fail')
+        self.assertEquals(get_breaker('facebook').state, OPEN)
+
+        # fails fast without calling the provider
+        self.assertRaises(ProviderUnavailable, session.get, self.url)
+        self.assertRaises(
+            ProviderUnavailable,
+            Account(provider='facebook', oauth_token='token').get_client
+        )
+        self.assertEquals(pool_stats()['requests'], 4)
+        self.assertEquals(instrumentation.snapshot()['breakers']['facebook']['opened'], 1)
+
+        # a successful trial call closes it
+        with override_settings(ACCOUNTS_BREAKER_RESET_TIMEOUT=0):
+            self.assertEquals(session.get(self.url).status_code, 200)
+        self.assertEquals(get_breaker('facebook').state, CLOSED)
+
+    @override_settings(ACCOUNTS_HTTP_RETRIES=0, ACCOUNTS_BREAKER_FAILURES=1)
+    def test_breaker_trial_raises(self):
+        session = PooledSession('facebook')
+        session.get(self.url + 'fail')
+        self.assertEquals(get_breaker('facebook').state, OPEN)
+
+        with override_settings(ACCOUNTS_BREAKER_RESET_TIMEOUT=0):
+            with patch('requests.Session.request', Mock(side_effect=ValueError)):
+                self.assertRaises(ValueError, session.get, self.url)
+            self.assertEquals(get_breaker('facebook').state, OPEN)
+            # the trial was released, the next one goes through
+            self.assertEquals(session.get(self.url).status_code, 200)
+        self.assertEquals(get_breaker('facebook').state, CLOSED)
+
+    @override_settings(ACCOUNTS_HTTP_RETRIES=0)
+    def test_views_fail_fast(self):
+        PooledSession('facebook').get(self.url + 'fail')
+        PooledSession('facebook').get(self.url + 'fail')
+        User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.client.login(username='user1', password='123456')
+
+        for url in (reverse('accounts_facebook_new'), reverse('accounts_facebook_callback')):
+            response = self.client.get(url, {'code': 'code'}, follow=True)
+            self.assertRedirects(response, reverse('accounts_account_list'))
+            self.assertContains(
+                response, u'O facebook está indisponível no momento, tente novamente mais tarde.'
+            )
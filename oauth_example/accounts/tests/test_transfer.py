@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+
+from datetime import datetime
+from StringIO import StringIO
+import gzip
+import json
+from mock import Mock, patch
+import os
+import shutil
+import tempfile
+
+from accounts.models import Account
+from accounts.transfer import TransferReport, export_accounts, import_accounts, import_chunk
+
+
+class TestTransfer(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
+        self.other = User.objects.create_user('user2', 'user2@email.com', '123456')
+        for i in range(5):
+            Account.objects.create(
+                user=self.user if i % 2 else self.other,
+                provider='youtube',
+                provider_id=str(i),
+                provider_username='fulano{0}'.format(i),
+                oauth_token='token{0}'.format(i),
+                refresh_token='refresh{0}'.format(i),
+                expires_in=datetime(2013, 5, 1, 12, 30, i, 250)
+            )
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rows(self):
+        return list(Account.objects.order_by('provider_id').values_list(
+            'user__username', 'provider_id', 'provider_username', 'oauth_token',
+            'refresh_token', 'expires_in'
+        ))
+
+    def test_round_trip(self):
+        path = os.path.join(self.dir, 'accounts.jsonl.gz')
+        before = self.rows()
+
+        stdout = StringIO()
+        call_command('export_accounts', path, chunk_size=2, stdout=stdout)
+        self.assertTrue(stdout.getvalue().startswith('5 accounts exported'))
+        lines = gzip.open(path).read().splitlines()
+        self.assertEquals(len(lines), 5)
+        self.assertEquals(json.loads(lines[0])['username'], 'user2')
+
+        Account.objects.all().delete()
+        stdout = StringIO()
+        call_command('import_accounts', path, chunk_size=2, stdout=stdout)
+        self.assertTrue(stdout.getvalue().startswith('5 accounts imported, 0 skipped'))
+        self.assertEquals(self.rows(), before)
+
+    def test_conflicts(self):
+        fileobj = StringIO()
+        export_accounts(fileobj, Account.objects.filter(provider_id__in=['1', '2']))
+        lines = fileobj.getvalue().splitlines()
+        row = json.loads(lines[0])
+        row.update(oauth_token='changed')
+        lines[0] = json.dumps(row)
+        # an account of a user missing here
+        lines.append(json.dumps(dict(row, username='nobody')))
+        # a new account
+        lines.append(json.dumps(dict(row, provider_id='9')))
+
+        report = import_accounts(StringIO('\n'.join(lines)))
+        self.assertEquals((report.written, report.skipped), (1, 3))
+        self.assertEquals(Account.objects.get(provider_id='1').oauth_token, 'token1')
+        self.assertEquals(Account.objects.get(provider_id='9').oauth_token, 'changed')
+
+        report = import_accounts(StringIO('\n'.join(lines)), update=True)
+        self.assertEquals((report.written, report.skipped), (3, 1))
+        self.assertEquals(Account.objects.get(provider_id='1').oauth_token, 'changed')
+        self.assertEquals(Account.objects.count(), 6)
+
+    @patch('accounts.models._supports_upsert', Mock(return_value=False))
+    def test_update_without_upsert_statement(self):
+        fileobj = StringIO()
+        export_accounts(fileobj, Account.objects.filter(provider_id='1'))
+        row = json.loads(fileobj.getvalue())
+        lines = [json.dumps(dict(row, oauth_token='changed'))]
+
+        # _save() goes through upsert() with the user pk
+        report = TransferReport(u'imported')
+        with patch('accounts.transfer.Account.objects.bulk_create', Mock(side_effect=IntegrityError)):
+            import_chunk(lines + [json.dumps(dict(row, provider_id='9'))], True, report)
+        self.assertEquals((report.written, report.skipped), (2, 0))
+        self.assertEquals(Account.objects.get(provider_id='1').oauth_token, 'changed')
+        self.assertEquals(Account.objects.get(provider_id='9').user, self.user)
@@ -2,16 +2,20 @@
 from django.test import TestCase
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.utils import override_settings
 
 from datetime import datetime, timedelta
 from mock import patch
 
 from accounts.models import Account
+from accounts.tokenstore import store_request_token, pop_request_token
 
 
 class TestIndexView(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.url = reverse('accounts_account_list')
         self.user = User.objects.create_user('user1', 'user1@email.com', '123456')
         self.account1 = Account.objects.create(
@@ -53,6 +57,48 @@ class TestIndexView(TestCase):
         self.assertTrue(self.account2 in response.context['account_list'])
         self.assertTrue(self.account3 in response.context['account_list'])
 
+    def test_render_from_cache(self):
+        self.client.get(self.url)
+        # only the session user is loaded
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEquals(len(response.context['account_list']), 3)
+
+        self.account1.delete()
+        response = self.client.get(self.url)
+        self.assertEquals(
+            list(response.context['account_list']),
+            [self.account2, self.account3]
+        )
+
+    @override_settings(ACCOUNTS_LIST_PAGE_SIZE=2)
+    def test_pagination(self):
+        response = self.client.get(self.url)
+        self.assertEquals(
+            list(response.context['account_list']),
+            [self.account1, self.account2]
+        )
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEquals(list(response.context['account_list']), [self.account3])
+        response = self.client.get(self.url, {'page': 9})
+        self.assertEquals(response.context['page_obj'].number, 2)
+
+    @override_settings(ACCOUNTS_LIST_PAGE_SIZE=2)
+    def test_pages_are_cached_apart(self):
+        self.client.get(self.url, {'page': 2})
+        # only the session user is loaded
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page': 2})
+        self.assertEquals(list(response.context['account_list']), [self.account3])
+        # the count is shared, the first page is queried on its own
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+        self.account3.provider_username = 'fulano4'
+        self.account3.save()
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEquals(response.context['account_list'][0].provider_username, 'fulano4')
+
 
 def twitter_get_request_token(*args, **kwargs):
     return u'request_token', u'secret_token'
@@ -77,6 +123,11 @@ class TestTwitterNewView(TestCase):
             response['Location'],
             'https://api.twitter.com/oauth/authorize?oauth_token=request_token'
         )
+        self.assertFalse('oauth_token_secret' in self.client.session)
+        self.assertEquals(
+            pop_request_token('twitter', self.user, 'request_token'),
+            'secret_token'
+        )
 
 
 def twitter_get_access_token(*args, **kwargs):
@@ -95,10 +146,6 @@ def twitter_get(*args, **kwargs):
     return TwitterGet()
 
 
-def twitter_get_session(*args, **kwargs):
-    return 'oauth_token_secret'
-
-
 class TestTwitterCallbackView(TestCase):
 
     def setUp(self):
@@ -126,11 +173,8 @@ class TestTwitterCallbackView(TestCase):
 
     @patch('rauth.OAuth1Service.get_access_token', twitter_get_access_token)
     @patch('rauth.OAuth1Session.get', twitter_get)
-    @patch('django.contrib.sessions.backends.signed_cookies.SessionStore.get', twitter_get_session)
     def test_render(self):
-        session = self.client.session
-        session['oauth_token_secret'] = 'oauth_token_secret'
-        session.save()
+        store_request_token('twitter', self.user, 'oauth_token', 'oauth_token_secret')
         response = self.client.get(
             self.url, 
             {'oauth_token': 'oauth_token', 'oauth_verifier': 'oauth_verifier'},
@@ -146,6 +190,29 @@ class TestTwitterCallbackView(TestCase):
             )
         )
 
+        # the secret works only once
+        response = self.client.get(
+            self.url,
+            {'oauth_token': 'oauth_token', 'oauth_verifier': 'oauth_verifier'},
+            follow=True
+        )
+        self.assertContains(response, u'Ocorreu um erro ao adicionar a conta do twitter.')
+
+    def test_render_other_user_token(self):
+        other = User.objects.create_user('user2', 'user2@email.com', '123456')
+        store_request_token('twitter', other, 'oauth_token', 'oauth_token_secret')
+        response = self.client.get(
+            self.url,
+            {'oauth_token': 'oauth_token', 'oauth_verifier': 'oauth_verifier'},
+            follow=True
+        )
+        self.assertContains(response, u'Ocorreu um erro ao adicionar a conta do twitter.')
+        # the replay does not use up the secret of its owner
+        self.assertEquals(
+            pop_request_token('twitter', other, 'oauth_token'), 'oauth_token_secret'
+        )
+        self.assertEquals(pop_request_token('twitter', other, 'oauth_token'), None)
+
 
 class TestFacebookNewView(TestCase):
     
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.cache import cache
+
+import hashlib
+import uuid
+
+
+# OAuth 1.0a request-token secrets live in the cache between the redirect to
+# the provider and the callback, keyed by the request token, so the session
+# cookie stays small and a user can run several flows at once
+def _key(provider, oauth_token):
+    # tokens come from the query string, keep them out of the raw cache key
+    digest = hashlib.sha1(oauth_token.encode('utf-8')).hexdigest()
+    return 'accounts:request_token:{0}:{1}'.format(provider, digest)
+
+
+def store_request_token(provider, user, oauth_token, oauth_token_secret):
+    cache.set(
+        _key(provider, oauth_token),
+        # the nonce tells apart flows that got the same token again
+        (user.pk, oauth_token_secret, uuid.uuid4().hex),
+        getattr(settings, 'ACCOUNTS_REQUEST_TOKEN_TIMEOUT', 600)
+    )
+
+
+def pop_request_token(provider, user, oauth_token):
+    # the secret is used once and only by the user who started the flow
+    key = _key(provider, oauth_token)
+    value = cache.get(key)
+    # checked before anything is removed, a replay of the token by someone
+    # else must not break the flow of its owner
+    if value is None or value[0] != user.pk:
+        return None
+    user_id, oauth_token_secret, nonce = value
+    # add() is atomic on memcached and redis, of two callbacks racing with
+    # the same token only one gets the secret
+    used = '{0}:used:{1}'.format(key, nonce)
+    if not cache.add(used, True, getattr(settings, 'ACCOUNTS_REQUEST_TOKEN_TIMEOUT', 600)):
+        return None
+    cache.delete(key)
+    return oauth_token_secret
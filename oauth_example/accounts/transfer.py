@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from django.contrib.auth.models import User
+from django.db import transaction, IntegrityError
+
+from datetime import datetime
+from itertools import islice
+import gzip
+import json
+import time
+
+from accounts.models import Account, invalidate_account_list
+
+
+# columns of an exported account, the user goes by username since ids
+# differ between environments. created_on and updated_on are left out, they
+# tell when the account arrived in the importing environment.
+EXPORT_FIELDS = (
+    'pk', 'user__username', 'provider', 'provider_id', 'provider_username',
+    'oauth_token', 'oauth_token_secret', 'refresh_token', 'expires_in'
+)
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class TransferReport(object):
+
+    def __init__(self, action):
+        self.action = action
+        self.written = 0
+        self.skipped = 0
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        if not self.elapsed:
+            return 0.0
+        return (self.written + self.skipped) / self.elapsed
+
+    def __unicode__(self):
+        return u'{0} accounts {1}, {2} skipped in {3:.1f}s ({4:.0f}/s)'.format(
+            self.written, self.action, self.skipped, self.elapsed, self.throughput
+        )
+
+
+def open_file(path, mode):
+    # .gz files are compressed, anything else is plain JSON Lines
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 'b')
+    return open(path, mode)
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def _load(field, value):
+    if field == 'expires_in' and value:
+        return datetime.strptime(value, DATETIME_FORMAT)
+    return value
+
+
+def iter_rows(queryset, chunk_size):
+    # keyset pagination, so memory stays constant on large tables
+    queryset = queryset.order_by('pk').values_list(*EXPORT_FIELDS)
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+        last_pk = chunk[-1][0]
+
+
+def export_accounts(fileobj, queryset=None, chunk_size=5000):
+    """
+    Writes one JSON object per account to fileobj.
+    """
+    if queryset is None:
+        queryset = Account.objects.all()
+
+    report = TransferReport(u'exported')
+    names = [name.replace('user__', '') for name in EXPORT_FIELDS[1:]]
+    for row in iter_rows(queryset, chunk_size):
+        fileobj.write(json.dumps(dict(zip(names, map(_dump, row[1:])))))
+        fileobj.write('\n')
+        report.written += 1
+
+    report.finished = time.time()
+    return report
+
+
+def _key(user_id, data):
+    return (user_id, data['provider'], data['provider_id'])
+
+
+def _save(key, fields, update, report):
+    if update:
+        fields = dict(fields)
+        del fields['provider'], fields['provider_id']
+        Account.objects.upsert(key[0], key[1], key[2], **fields)
+        report.written += 1
+        return
+
+    sid = transaction.savepoint()
+    try:
+        Account.objects.create(user_id=key[0], **fields)
+        transaction.savepoint_commit(sid)
+        report.written += 1
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
+        report.skipped += 1
+
+
+def import_chunk(lines, update, report):
+    rows = [json.loads(line) for line in lines if line.strip()]
+    users = dict(
+        User.objects.filter(username__in=set(row['username'] for row in rows))
+        .values_list('username', 'pk')
+    )
+
+    # rows of unknown users are skipped, later rows of the same account win
+    accounts = {}
+    for row in rows:
+        user_id = users.get(row['username'])
+        if user_id is None:
+            report.skipped += 1
+            continue
+        fields = dict(
+            (name, _load(name, value)) for name, value in row.items() if name != 'username'
+        )
+        accounts[_key(user_id, fields)] = fields
+    if not accounts:
+        return
+
+    existing = set(
+        Account.objects.filter(
+            user__in=set(key[0] for key in accounts),
+            provider_id__in=set(key[2] for key in accounts)
+        ).values_list('user', 'provider', 'provider_id')
+    )
+
+    new = [key for key in accounts if key not in existing]
+    with transaction.commit_on_success():
+        sid = transaction.savepoint()
+        try:
+            Account.objects.bulk_create([
+                Account(user_id=key[0], **accounts[key]) for key in new
+            ])
+            transaction.savepoint_commit(sid)
+            report.written += len(new)
+        except IntegrityError:
+            # rows inserted meanwhile by someone else, go one by one
+            transaction.savepoint_rollback(sid)
+            for key in new:
+                _save(key, accounts[key], update, report)
+
+        for key in existing.intersection(accounts):
+            if update:
+                _save(key, accounts[key], update, report)
+            else:
+                report.skipped += 1
+
+    # bulk_create does not send post_save
+    for user_id in set(key[0] for key in accounts):
+        invalidate_account_list(user_id)
+
+
+def import_accounts(fileobj, chunk_size=5000, update=False):
+    """
+    Creates the accounts read from a file of export_accounts(). Accounts
+    that already exist, by (user, provider, provider_id), are skipped, or
+    updated with update=True.
+    """
+    report = TransferReport(u'imported')
+    lines = iter(fileobj)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        import_chunk(chunk, update, report)
+
+    report.finished = time.time()
+    return report
@@ -1,21 +1,26 @@
 # -*- coding: utf-8 -*-
 from django.conf.urls import patterns, url
 
+from accounts.providers import PROVIDER_LIST
+
 
 urlpatterns = patterns(
     'accounts.views',
     # admin app
     url(r'^$', 'account_list', name='accounts_account_list'),
 
-    url(r'^new/twitter/$', 'twitter_new', name='accounts_twitter_new'),
-
-    url(r'^new/twitter/callback/$', 'twitter_callback', name='accounts_twitter_callback'),
+    url(r'^stats/$', 'provider_stats', name='accounts_provider_stats'),
+)
 
-    url(r'^new/facebook/$', 'facebook_new', name='accounts_facebook_new'),
 
-    url(r'^new/facebook/callback/$', 'facebook_callback', name='accounts_facebook_callback'),
+# one new/callback pair per registered provider
+for provider in PROVIDER_LIST:
+    urlpatterns += patterns(
+        'accounts.views',
 
-    url(r'^new/youtube/$', 'youtube_new', name='accounts_youtube_new'),
+        url(r'^new/{0}/$'.format(provider.name), 'account_new',
+            {'provider': provider.name}, name=provider.new_url_name),
 
-    url(r'^new/youtube/callback/$', 'youtube_callback', name='accounts_youtube_callback'),
-)
+        url(r'^new/{0}/callback/$'.format(provider.name), 'account_callback',
+            {'provider': provider.name}, name=provider.callback_url_name),
+    )
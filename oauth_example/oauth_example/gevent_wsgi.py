@@ -0,0 +1,44 @@
+"""
+Cooperative WSGI entry point, an alternative to wsgi.py for deployments that
+hold many provider round-trips in flight at once.
+
+Every request runs in a greenlet and blocking socket I/O yields to the other
+greenlets, so the accounts views wait on the providers without tying up an
+OS thread each. Run it with
+
+    gunicorn -k gevent --worker-connections 1000 oauth_example.gevent_wsgi:application
+
+or, without gunicorn,
+
+    python -m oauth_example.gevent_wsgi 0.0.0.0:8000
+
+Raise ACCOUNTS_HTTP_POOL_MAXSIZE along with the worker connections, or most
+provider calls will open a connection of their own.
+"""
+# must run before anything else imports socket, threading or ssl
+from gevent import monkey
+monkey.patch_all()
+
+try:
+    # psycopg2 blocks in C, psycogreen makes it yield while it waits
+    from psycogreen.gevent import patch_psycopg
+except ImportError:
+    pass
+else:
+    patch_psycopg()
+
+import os
+import sys
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oauth_example.settings")
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+
+    address = sys.argv[1] if len(sys.argv) > 1 else '127.0.0.1:8000'
+    host, port = address.rsplit(':', 1)
+    WSGIServer((host, int(port)), application).serve_forever()
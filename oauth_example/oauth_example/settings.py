@@ -204,6 +204,88 @@ YOUTUBE_CLIENT_ID = '863393693267.apps.googleusercontent.com'
 YOUTUBE_CLIENT_SECRET = '1SNKC80ZQwBGl5KT9y4-wunu'
 YOUTUBE_CALLBACK_URL = 'http://mutiraopython.org/accounts/new/youtube/callback/'
 
+# provider origins replaced by another base url, e.g. the local fake
+# provider: ACCOUNTS_PROVIDER_HOSTS = {'https://api.twitter.com': 'http://127.0.0.1:8001/twitter'}
+ACCOUNTS_PROVIDER_HOSTS = {}
+
+# outbound http connection pool shared by the provider sessions
+ACCOUNTS_HTTP_POOL_CONNECTIONS = 10  # number of hosts kept in the pool
+ACCOUNTS_HTTP_POOL_MAXSIZE = 10  # keep-alive connections per host
+ACCOUNTS_HTTP_CONNECTION_LIFETIME = 300  # seconds before the pool is rebuilt
+
+# latency histograms of the provider calls, see ./manage.py provider_stats
+ACCOUNTS_INSTRUMENTATION = False
+ACCOUNTS_INSTRUMENTATION_FLUSH_INTERVAL = 10  # seconds between cache flushes
+
+# outbound call timeouts in (connect, read) seconds, overridden per provider
+# and endpoint path: {'youtube': {'/o/oauth2/token': (3.05, 5)}}
+ACCOUNTS_HTTP_TIMEOUT = (3.05, 10)
+ACCOUNTS_HTTP_TIMEOUTS = {}
+ACCOUNTS_HTTP_RETRIES = 2  # retries of idempotent calls, with jittered backoff
+ACCOUNTS_HTTP_RETRY_BACKOFF = 0.1  # seconds, doubled on every attempt
+
+# threads behind Account.get_client_async() outside of gevent
+ACCOUNTS_CLIENT_WORKERS = 8
+
+# conditional GET cache of the Account.get_client() sessions, answers are
+# served from memory for the TTL and revalidated with ETag/Last-Modified after
+ACCOUNTS_HTTP_CACHE = True
+ACCOUNTS_HTTP_CACHE_TTL = 0  # seconds, 0 revalidates every time
+# per process, the least recently used answers go first past either bound
+ACCOUNTS_HTTP_CACHE_SIZE = 200  # entries
+ACCOUNTS_HTTP_CACHE_MAX_BYTES = 8 * 1024 * 1024  # of bodies
+ACCOUNTS_HTTP_CACHE_MAX_BODY = 256 * 1024  # bytes, larger answers are not kept
+
+# concurrent calls per provider in accounts.fanout.fan_out()
+ACCOUNTS_FANOUT_LIMIT = 4
+ACCOUNTS_FANOUT_LIMITS = {}  # per provider, e.g. {'twitter': 2}
+
+# Account.get_rate_limited_client(), budgets come from Provider.rate_limit
+ACCOUNTS_RATELIMIT_MAX_WAIT = 30  # seconds a call may wait for its budget
+ACCOUNTS_RATELIMIT_COOLDOWN = 60  # seconds to back off on a throttling error without Retry-After
+
+# per-provider circuit breaker, calls fail fast while it is open
+ACCOUNTS_BREAKER_FAILURES = 5  # consecutive failures that open it
+ACCOUNTS_BREAKER_RESET_TIMEOUT = 30  # seconds before a trial call
+
+# account list page
+ACCOUNTS_LIST_PAGE_SIZE = 25
+ACCOUNTS_LIST_CACHE_TIMEOUT = 300  # seconds
+
+# hand out tokens inside the expiry margin and refresh them in background
+ACCOUNTS_STALE_WHILE_REVALIDATE = False
+ACCOUNTS_BACKGROUND_REFRESH_WORKERS = 2
+
+# complete callbacks in ./manage.py run_callback_worker instead of the request
+ACCOUNTS_ASYNC_CALLBACKS = False
+ACCOUNTS_CALLBACK_JOB_TIMEOUT = 300  # seconds before a running job is given up
+ACCOUNTS_CALLBACK_JOB_RETENTION = 86400  # seconds finished jobs are kept
+
+# lifetime of the twitter request-token secrets kept in the cache between the
+# redirect and the callback. The cache must be shared by every web process,
+# the default local-memory one is not: with more than one process configure
+# memcached or redis in settings_local.py, e.g.
+#
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#         'LOCATION': '127.0.0.1:11211',
+#     }
+# }
+ACCOUNTS_REQUEST_TOKEN_TIMEOUT = 600  # seconds
+
+# profile snapshots older than this are fetched again by
+# ./manage.py refresh_profiles, the pages only read the snapshots
+ACCOUNTS_PROFILE_TTL = 86400  # seconds
+
+# seconds the account changelist keeps its counts, COUNT(*) is a full scan
+# on a large table
+ACCOUNTS_ADMIN_COUNT_TIMEOUT = 60
+
+# accounts an admin action refreshes or revokes at once, the provider calls
+# run within the request
+ACCOUNTS_ADMIN_ACTION_LIMIT = 200
+
 # ============================================================================
 # Load settings_local.py if exists
 # ==============================================================================